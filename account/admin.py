@@ -1,5 +1,33 @@
 from django.contrib import admin
-from account.models import Account
+from django.db import transaction
+
+from account.models import Account, AccountTombstone
+from account.signals import accounts_changed
+
+
+class AccountAdmin(admin.ModelAdmin):
+    """
+    Administration of the accounts, notifying the changes done from here like the API does
+    """
+    def _changed(self):
+        transaction.on_commit(lambda: accounts_changed.send(sender=Account))
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        self._changed()
+
+    def delete_model(self, request, obj):
+        account_id = obj.pk
+        super().delete_model(request, obj)
+        AccountTombstone.objects.create(account_id=account_id)
+        self._changed()
+
+    def delete_queryset(self, request, queryset):
+        account_ids = list(queryset.values_list('id', flat=True))
+        super().delete_queryset(request, queryset)
+        AccountTombstone.objects.bulk_create([AccountTombstone(account_id=account_id) for account_id in account_ids])
+        self._changed()
+
 
 # Adding Account class to administration page
-admin.site.register(Account)
+admin.site.register(Account, AccountAdmin)
@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class AccountConfig(AppConfig):
     name = 'account'
+
+    def ready(self):
+        # Connecting the signal receivers
+        from account import signals  # noqa: F401
@@ -0,0 +1,322 @@
+import hashlib
+import random
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.authtoken.models import Token
+
+
+class TokenCache:
+    """
+    Bounded LRU cache with a time to live, holding the (user, token) pair of the recently used tokens.
+
+    Optionally backed by a shared Django cache (`SHARED_CACHE` alias), so the other processes can reuse the
+    lookups done by this one. The shared cache also holds a generation, replaced on every invalidation and checked
+    before returning an entry of this process: a token logged out in any process is refused by all of them
+    """
+    # Setting holding the configuration of the cache, and its defaults
+    SETTING = 'TOKEN_AUTH_CACHE'
+    DEFAULTS = {'MAX_SIZE': 10000, 'TTL': 60, 'SHARED_CACHE': 'shared'}
+    # Prefix of the keys in the shared cache
+    SHARED_PREFIX = 'auth-token'
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def _config(cls):
+        config = dict(cls.DEFAULTS)
+        config.update(getattr(settings, cls.SETTING, {}))
+        return config
+
+    @classmethod
+    def _shared_key(cls, key):
+        return '{0}:{1}'.format(cls.SHARED_PREFIX, key)
+
+    @classmethod
+    def _generation_key(cls):
+        return '{0}-generation'.format(cls.SHARED_PREFIX)
+
+    def _generation(self, shared):
+        """
+        Return the current generation of the shared cache, initializing it if it is not there
+        """
+        key = self._generation_key()
+        generation = shared.get(key)
+        if generation is None:
+            # Starting from a random value, so the entries kept with a generation lost by the cache are never reused
+            shared.add(key, random.getrandbits(53), None)
+            generation = shared.get(key)
+        return generation
+
+    def _bump_generation(self, shared):
+        # Replaced rather than incremented, like the accounts version: two concurrent bumps always change it
+        shared.set(self._generation_key(), random.getrandbits(53), None)
+
+    def get(self, key):
+        """
+        Return the cached (user, token) pair for the token key, or None
+        """
+        config = self._config()
+        shared = caches[config['SHARED_CACHE']] if config['SHARED_CACHE'] else None
+        # Entries kept by this process before an invalidation (in any process) are not trusted anymore
+        generation = self._generation(shared) if shared is not None else None
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now and entry[2] == generation:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                del self._entries[key]
+
+        if shared is not None:
+            value = shared.get(self._shared_key(key))
+            if value is not None:
+                self._store(key, value, config, generation)
+                with self._lock:
+                    self.hits += 1
+                return value
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, key, value):
+        """
+        Cache the (user, token) pair for the token key
+        """
+        config = self._config()
+        if config['SHARED_CACHE']:
+            shared = caches[config['SHARED_CACHE']]
+            self._store(key, value, config, self._generation(shared))
+            shared.set(self._shared_key(key), value, config['TTL'])
+        else:
+            self._store(key, value, config)
+
+    def _store(self, key, value, config, generation=None):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + config['TTL'], value, generation)
+            self._entries.move_to_end(key)
+            while len(self._entries) > config['MAX_SIZE']:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key):
+        """
+        Forget the given token key, in this process and in the shared cache, and make the other processes check
+        their entries again
+        """
+        with self._lock:
+            self._entries.pop(key, None)
+        shared = self._config()['SHARED_CACHE']
+        if shared:
+            # Deleted before the bump, the other processes cannot reload the entry with the new generation
+            caches[shared].delete(self._shared_key(key))
+            self._bump_generation(caches[shared])
+
+    def invalidate_user(self, user_pk):
+        """
+        Forget all the tokens of the given user, in this process and in the shared cache, and make the other
+        processes check their entries again
+        """
+        with self._lock:
+            keys = [key for key, (_, (user, _), _) in self._entries.items() if user.pk == user_pk]
+            for key in keys:
+                del self._entries[key]
+
+        shared = self._config()['SHARED_CACHE']
+        if shared:
+            # Other processes could have cached tokens that this one never saw
+            keys = Token.objects.filter(user_id=user_pk).values_list('key', flat=True)
+            caches[shared].delete_many([self._shared_key(key) for key in keys])
+            self._bump_generation(caches[shared])
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        """
+        Return the cache counters
+        """
+        with self._lock:
+            return {'size': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
+
+# One cache per process, shared by all the threads
+token_cache = TokenCache()
+
+
+def token_expiry_config():
+    config = {'LIFETIME': 7 * 24 * 3600, 'REFRESH_AFTER': 3600}
+    config.update(getattr(settings, 'TOKEN_EXPIRY', {}))
+    return config
+
+
+def token_expired(token, now=None):
+    """
+    Whether the token was not used (its `created` date refreshed) in the last `TOKEN_EXPIRY['LIFETIME']` seconds
+    """
+    lifetime = token_expiry_config()['LIFETIME']
+    if lifetime is None:
+        return False
+    return token.created <= (now or timezone.now()) - timedelta(seconds=lifetime)
+
+
+def expired_tokens(now=None):
+    """
+    Queryset of the expired tokens (none if they never expire), using the index on `created`
+    """
+    lifetime = token_expiry_config()['LIFETIME']
+    if lifetime is None:
+        return Token.objects.none()
+    return Token.objects.filter(created__lte=(now or timezone.now()) - timedelta(seconds=lifetime))
+
+
+def purge_expired_tokens(batch_size=1000, pause=0.0):
+    """
+    Delete the expired tokens in batches of `batch_size`, each one in its own short transaction (sleeping `pause`
+    seconds between them), yielding the number of tokens deleted so far
+    """
+    deleted = 0
+    now = timezone.now()
+    while True:
+        keys = list(expired_tokens(now).values_list('key', flat=True)[:batch_size])
+        if not keys:
+            return
+        # Tokens refreshed since the select are still used, the expiry condition is checked again
+        deleted += expired_tokens(now).filter(key__in=keys).delete()[0]
+        yield deleted
+        if pause:
+            time.sleep(pause)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Token authentication which avoids querying the token and its user on every request.
+
+    The cached entries are removed through signals when the token is deleted (logout) or its user modified, in every
+    process sharing `TOKEN_AUTH_CACHE['SHARED_CACHE']`, and expire after `TOKEN_AUTH_CACHE['TTL']` seconds.
+
+    Tokens expire when they are not used for `TOKEN_EXPIRY['LIFETIME']` seconds: their `created` date is moved
+    forward when they are used, at most once every `REFRESH_AFTER` seconds, so checking it needs no query
+    """
+    def authenticate_credentials(self, key):
+        cached = token_cache.get(key)
+        if cached is None:
+            # Querying the database and checking that the token exists and the user is active as usual
+            cached = super().authenticate_credentials(key)
+            token_cache.set(key, cached)
+
+        token = cached[1]
+        now = timezone.now()
+        if token_expired(token, now):
+            token_cache.invalidate(key)
+            raise AuthenticationFailed(_('Token has expired.'))
+        if token.created <= now - timedelta(seconds=token_expiry_config()['REFRESH_AFTER']):
+            # Sliding expiry, the cached token (shared by the threads) is refreshed along with the row
+            Token.objects.filter(key=key).update(created=now)
+            token.created = now
+            token_cache.set(key, cached)
+        return cached
+
+
+class _Flight:
+    """
+    Exchange in progress, waited by the other requests of the same access token
+    """
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class ExchangeCache(TokenCache):
+    """
+    Short lived cache of the OAuth2 access tokens already exchanged, holding the (user, API token) pair they gave, so
+    the provider and the social auth pipeline are not called again for the same access token.
+
+    The concurrent exchanges of the same access token are collapsed into one (single-flight, per process): the first
+    request calls the provider and the others wait for its result. Cached pairs are only returned while their API
+    token is still accepted (not deleted by a logout, user still active)
+    """
+    SETTING = 'OAUTH2_EXCHANGE_CACHE'
+    DEFAULTS = {'MAX_SIZE': 10000, 'TTL': 30, 'SHARED_CACHE': None}
+    SHARED_PREFIX = 'oauth2-exchange'
+
+    def __init__(self):
+        super().__init__()
+        self._flights = {}
+
+    @staticmethod
+    def key(backend, access_token):
+        # The access tokens are credentials, only their digest is kept
+        return hashlib.sha256('{0}:{1}'.format(backend, access_token).encode()).hexdigest()
+
+    @staticmethod
+    def _usable(value):
+        try:
+            CachedTokenAuthentication().authenticate_credentials(value[1].key)
+        except AuthenticationFailed:
+            return False
+        return True
+
+    def exchange(self, key, function):
+        """
+        Return the cached (user, token) pair of the access token key, or the one returned by `function()`, called
+        once for all the concurrent requests of the key. Pairs without token (inactive users) are not cached
+        """
+        cached = self.get(key)
+        if cached is not None:
+            if self._usable(cached):
+                return cached
+            self.invalidate(key)
+
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                # The previous exchange could have finished since the lookup above
+                entry = self._entries.get(key)
+                if entry is not None and entry[0] > time.monotonic():
+                    return entry[1]
+                flight = self._flights[key] = _Flight()
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = function()
+            if flight.value is not None and flight.value[1] is not None:
+                self.set(key, flight.value)
+                # The API token is used right after the exchange, and checked again on the next one
+                token_cache.set(flight.value[1].key, flight.value)
+            return flight.value
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+
+# One cache per process, shared by all the threads
+exchange_cache = ExchangeCache()
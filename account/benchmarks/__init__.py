@@ -0,0 +1,130 @@
+"""
+Benchmarks of the account application, run with `python manage.py benchmark <name>`.
+
+Every module of this package exposes a `run(sizes, repeat)` function returning a JSON serializable dict with its
+measurements. They work against the configured database, and everything they create is rolled back at the end (or
+deleted, for the ones needing committed data)
+"""
+import importlib
+import os
+import time
+import tracemalloc
+from contextlib import contextmanager
+from itertools import islice
+
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from account.cache import bump_accounts_version
+from account.models import Account
+from account.operations import insert_batch_size
+from account.seeding import generate_accounts
+
+# Available benchmarks, the names of the modules of this package
+BENCHMARKS = ('cache', 'connections', 'endpoints', 'iban', 'payload', 'serving')
+
+# Maximum values accepted for the measurements, checked with `python manage.py benchmark --budgets`
+BUDGETS_FILE = os.path.join(os.path.dirname(__file__), 'budgets.json')
+
+
+def load(name):
+    return importlib.import_module('account.benchmarks.{0}'.format(name))
+
+
+def percentile(values, percent):
+    """
+    Return the given percentile (0-100) of the values, using the nearest rank
+    """
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(percent / 100.0 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def measure(function, repeat, setup=None):
+    """
+    Call the function `repeat` times, returning the p50/p95/max of the durations in milliseconds.
+
+    If given, `setup` is called (not measured) before every call, and the function receives what it returns
+    """
+    durations = []
+    for _ in range(repeat):
+        args = () if setup is None else (setup(),)
+        start = time.perf_counter()
+        function(*args)
+        durations.append((time.perf_counter() - start) * 1000)
+    return {
+        'p50_ms': round(percentile(durations, 50), 3),
+        'p95_ms': round(percentile(durations, 95), 3),
+        'max_ms': round(max(durations), 3),
+    }
+
+
+def footprint(function, *args):
+    """
+    Call the function once, returning the number of queries it did and the peak of the memory it allocated in KiB
+    (measured apart from the latency, tracing the allocations slows everything down)
+    """
+    tracemalloc.start()
+    try:
+        with CaptureQueriesContext(connection) as queries:
+            function(*args)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    # Not counting the savepoints, they are there only because the benchmarks run inside a transaction
+    statements = [query for query in queries.captured_queries if 'SAVEPOINT' not in query['sql']]
+    return {'queries': len(statements), 'peak_kb': round(peak / 1024, 1)}
+
+
+def check_budgets(results, budgets):
+    """
+    Compare the results of the benchmarks with the budgets, returning the list of the measurements exceeding them.
+
+    The budgets of every benchmark are given per size, and then per measurement, like
+    `{"endpoints": {"1000": {"accounts": {"p95_ms": 50, "queries": 3}}}}`. Sizes not in the budgets are not checked
+    """
+    exceeded = []
+    for name, rows in results.items():
+        for row in rows:
+            for key, limits in budgets.get(name, {}).get(str(row['size']), {}).items():
+                for metric, limit in limits.items():
+                    value = row.get(key, {}).get(metric)
+                    if value is not None and value > limit:
+                        exceeded.append('{0} {1} (size {2}): {3} = {4}, budget {5}'.format(
+                            name, key, row['size'], metric, value, limit))
+    return exceeded
+
+
+class _Rollback(Exception):
+    pass
+
+
+@contextmanager
+def rolled_back():
+    """
+    Run the block inside a transaction which is always rolled back, keeping the database as it was (and forgetting
+    the accounts listing cached meanwhile, the cache is shared with the running processes)
+    """
+    try:
+        with transaction.atomic():
+            yield
+            raise _Rollback
+    except _Rollback:
+        pass
+    finally:
+        bump_accounts_version()
+
+
+def create_accounts(count, creators=1, batch_size=1000):
+    """
+    Create `count` accounts spread among `creators` new users, returning the users
+    """
+    users = [User.objects.create_user('benchmark-{0}'.format(i)) for i in range(creators)]
+    accounts = generate_accounts(count, users)
+    # Never holding more than one batch of them in memory
+    while True:
+        batch = list(islice(accounts, batch_size))
+        if not batch:
+            return users
+        Account.objects.bulk_create(batch, batch_size=insert_batch_size(batch, batch_size))
@@ -0,0 +1,49 @@
+"""
+Latency of the accounts listing built from the database, from a cold cache and from a warm cache, with the cache
+backends which can be shared by the processes (local memory can not)
+"""
+import tempfile
+
+from django.core.cache import caches
+from django.core.management import call_command
+from django.test.utils import override_settings
+
+from account.benchmarks import create_accounts, measure, rolled_back
+from account.cache import bump_accounts_version, cached_account_list
+from account.models import Account
+from account.views import ACCOUNT_LIST_FIELDS, account_list_data
+
+
+def run(sizes, repeat):
+    results = []
+    with tempfile.TemporaryDirectory() as location:
+        backends = {
+            'filebased': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location},
+            # Its table is created inside the transaction of the benchmark, and rolled back with it
+            'database': {'BACKEND': 'django.core.cache.backends.db.DatabaseCache', 'LOCATION': 'benchmark_cache'},
+        }
+        for size in sizes:
+            with rolled_back():
+                user, other = create_accounts(size, creators=2)
+
+                def uncached():
+                    account_list_data(Account.objects.order_by('id').values(*ACCOUNT_LIST_FIELDS), user)
+
+                result = {'size': size, 'uncached': measure(uncached, repeat)}
+                for name, backend in backends.items():
+                    with override_settings(CACHES={'default': backend}, ACCOUNTS_CACHE='default'):
+                        call_command('createcachetable', verbosity=0)
+                        caches['default'].clear()
+
+                        def miss():
+                            bump_accounts_version()
+                            cached_account_list(user)
+
+                        cached_account_list(user)
+                        cached_account_list(other)
+                        result[name] = {
+                            'miss': measure(miss, repeat),
+                            'hit': measure(lambda: cached_account_list(user), repeat),
+                        }
+                results.append(result)
+    return results
@@ -0,0 +1,58 @@
+"""
+Latency of a request doing `size` small queries (an account looked up by id) when its database connection is opened
+and closed by every request (CONN_MAX_AGE 0), kept by the thread for the next ones (checked by CONN_HEALTH_CHECKS before
+its first query) or taken from the pool of the process (POOL).
+
+Every mode uses its own connection to the configured database, opened and closed like Django does at the start and
+the end of every request. Here the sizes are the number of queries per request
+"""
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from account.benchmarks import measure
+from account.db.pool import close_pools
+from account.models import Account
+
+# Database alias used by the benchmark, removed at the end
+ALIAS = 'benchmark-connections'
+
+# Backends of account.db (adding the health checks and the pool) for each backend of Django
+ENGINES = {
+    'django.db.backends.postgresql': 'account.db.postgresql',
+    'django.db.backends.sqlite3': 'account.db.sqlite3',
+}
+
+MODES = (
+    ('no_persistence', {'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': False, 'POOL': None}),
+    ('persistent', {'CONN_MAX_AGE': 600, 'CONN_HEALTH_CHECKS': True, 'POOL': None}),
+    ('pool', {'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': True, 'POOL': {'MAX_SIZE': 4}}),
+)
+
+
+def run(sizes, repeat):
+    settings_dict = dict(connections.databases[DEFAULT_DB_ALIAS])
+    settings_dict['ENGINE'] = ENGINES.get(settings_dict['ENGINE'], settings_dict['ENGINE'])
+    assert settings_dict['ENGINE'] in ENGINES.values(), 'No pool for {0}'.format(settings_dict['ENGINE'])
+
+    results = []
+    for size in sizes:
+        result = {'size': size}
+        for mode, options in MODES:
+            connections.databases[ALIAS] = dict(settings_dict, **options)
+            connection = connections[ALIAS]
+
+            def request():
+                # Like the request_started and request_finished signals do
+                connection.close_if_unusable_or_obsolete()
+                for _ in range(size):
+                    Account.objects.using(ALIAS).filter(id=0).exists()
+                connection.close_if_unusable_or_obsolete()
+
+            try:
+                result[mode] = measure(request, repeat)
+            finally:
+                connection.close()
+                close_pools()
+                del connections.databases[ALIAS]
+                delattr(connections._connections, ALIAS)
+        results.append(result)
+    return results
@@ -0,0 +1,92 @@
+"""
+Latency, queries and peak memory of every request of the API (login with the stub OAuth2 backend, exchanging the
+access token or reusing the exchange, listing, creation, modification, deletion and logout), done through the test
+client with the whole middleware stack
+"""
+import random
+
+from django.urls import reverse
+
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from account.authentication import exchange_cache
+from account.benchmarks import create_accounts, footprint, measure, rolled_back
+from account.benchmarks.oauth2 import stub_oauth2
+from account.models import Account
+from account.seeding import SEED_COUNTRIES, random_iban
+
+
+def _ok(response):
+    # A failed request would be much faster than a good one, measuring nothing
+    assert response.status_code < 300, (response.status_code, response.content)
+    return response
+
+
+def _client(token=None):
+    # Using one of the allowed hosts, the test runner is not there to allow the `testserver` of the test client
+    client = APIClient(SERVER_NAME='localhost')
+    if token is not None:
+        client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+    return client
+
+
+def run(sizes, repeat):
+    results = []
+    # Not the seed of the created accounts, the new IBANs would be the same ones
+    rng = random.Random('endpoints')
+    for size in sizes:
+        with rolled_back(), stub_oauth2():
+            user, _ = create_accounts(size, creators=2)
+            client = _client(Token.objects.create(user=user))
+            # Accounts of the user to modify and delete, one per call (plus the one measuring the footprint)
+            owned = list(Account.objects.filter(creator=user).values_list('id', flat=True)[:2 * (repeat + 1)])
+            assert len(owned) == 2 * (repeat + 1), 'Not enough accounts to modify/delete, increase the size'
+            modified, deleted = owned[:repeat + 1], owned[repeat + 1:]
+
+            def login(access_token='benchmark@example.com'):
+                _ok(_client().post(reverse('token_authentication', args=['stub']),
+                                   {'access_token': access_token}, format='json'))
+
+            def forget_exchanges():
+                # Going through the provider and the pipeline every time, like a new access token would
+                exchange_cache.clear()
+                return 'benchmark@example.com'
+
+            def accounts():
+                _ok(client.get(reverse('accounts:accounts')))
+
+            def new_account():
+                return {'first_name': 'Agustin', 'last_name': 'Martinez',
+                        'iban': random_iban(rng, rng.choice(SEED_COUNTRIES))}
+
+            def add(data):
+                _ok(client.post(reverse('accounts:accounts_add'), data, format='json'))
+
+            def modify(account_id):
+                _ok(client.put(reverse('accounts:accounts_modify'), {'id': account_id, 'first_name': 'Eva'},
+                               format='json'))
+
+            def delete(account_id):
+                _ok(client.delete(reverse('accounts:accounts_delete'), {'id': account_id}, format='json'))
+
+            def new_session():
+                return _client(Token.objects.get_or_create(user=user)[0])
+
+            def logout(session):
+                _ok(session.post(reverse('logout')))
+
+            result = {'size': size}
+            for name, function, setup in (
+                ('token_authentication', login, forget_exchanges),
+                ('token_authentication_cached', login, None),
+                ('accounts', accounts, None),
+                ('accounts_add', add, new_account),
+                ('accounts_modify', modify, iter(modified).__next__),
+                ('accounts_delete', delete, iter(deleted).__next__),
+                ('logout', logout, new_session),
+            ):
+                result[name] = measure(function, repeat, setup)
+                result[name].update(footprint(function, *(() if setup is None else (setup(),))))
+            results.append(result)
+    return results
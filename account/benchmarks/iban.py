@@ -0,0 +1,82 @@
+"""
+IBAN validation throughput of the previous implementation (generic length check) against the current one (per
+country checks first), one by one and in batch
+"""
+from itertools import cycle, islice
+
+from rest_framework import serializers
+
+from account.benchmarks import measure
+from account.utils import check_iban, mod97, process_iban, verify_ibans
+
+# Valid IBANs of several countries, plus malformed ones rejected at different steps
+SAMPLES = (
+    'ES7620770024003102575766', 'GB82WEST12345698765432', 'DE89370400440532013000', 'FR1420041010050500013M02606',
+    'NL91ABNA0417164300', 'MT84MALT011000012345MTLCAST001S', 'ES7620770024003102575767', 'DE8937040044053201300',
+    'XX00123456789',
+)
+
+
+def legacy_verify_iban(iban):
+    """
+    Implementation before the per-country checks: generic length check, then a big integer for the remainder
+    """
+    iban_fixed = iban.replace(' ', '')
+    if 5 < len(iban_fixed) < 34:
+        if int(process_iban(iban_fixed)) % 97 == 1:
+            return iban_fixed
+        else:
+            raise serializers.ValidationError("IBAN has not the correct format")
+    else:
+        raise serializers.ValidationError("IBAN is too short")
+
+
+def chunked_mod97(digits, chunk=9):
+    """
+    Remainder computed 9 digits at a time, never building an integer bigger than a machine word
+    """
+    remainder = 0
+    for start in range(0, len(digits), chunk):
+        part = digits[start:start + chunk]
+        remainder = (remainder * 10 ** len(part) + int(part)) % 97
+    return remainder
+
+
+def _legacy(ibans):
+    for iban in ibans:
+        try:
+            legacy_verify_iban(iban)
+        except (serializers.ValidationError, ValueError):
+            pass
+
+
+def _current(ibans):
+    for iban in ibans:
+        check_iban(iban)
+
+
+def _batch(ibans):
+    for _ in verify_ibans(ibans):
+        pass
+
+
+def run(sizes, repeat):
+    results = []
+    for size in sizes:
+        ibans = list(islice(cycle(SAMPLES), size))
+        # Whole runs over all the IBANs are long, a few of them are enough
+        runs = max(1, min(repeat, 3))
+        result = {
+            'size': size,
+            'legacy': measure(lambda: _legacy(ibans), runs),
+            'current': measure(lambda: _current(ibans), runs),
+            'batch': measure(lambda: _batch(ibans), runs),
+        }
+        # Only the remainder, on the digits of the valid IBANs
+        digits = [process_iban(iban) for iban in ibans if not check_iban(iban).error]
+        result['mod97_int'] = measure(lambda: [mod97(value) for value in digits], runs)
+        result['mod97_chunked'] = measure(lambda: [chunked_mod97(value) for value in digits], runs)
+        for name in ('legacy', 'current', 'batch'):
+            result[name]['ibans_per_second'] = int(size / (result[name]['p50_ms'] / 1000))
+        results.append(result)
+    return results
@@ -0,0 +1,58 @@
+"""
+OAuth2 backend for the tests and the benchmarks only, kept out of the application modules so it can never be enabled
+by the settings of a running server
+"""
+from contextlib import contextmanager
+from unittest import mock
+
+from django.conf import settings
+from django.test.utils import override_settings
+
+from requests import Response
+from requests.exceptions import HTTPError
+from social_core.backends.oauth import BaseOAuth2
+from social_core.backends.utils import load_backends
+
+
+class StubOAuth2(BaseOAuth2):
+    """
+    OAuth2 backend which never calls any provider, used by the tests and the benchmarks to go through the whole
+    `token_authentication` flow (pipeline included) offline.
+
+    The access token is the email of the user, tokens without '@' are rejected like the provider would do. It must
+    never be listed in AUTHENTICATION_BACKENDS, use `stub_oauth2()` to enable it temporarily
+    """
+    name = 'stub'
+    ID_KEY = 'email'
+    AUTHORIZATION_URL = 'https://stub.invalid/authorize'
+    ACCESS_TOKEN_URL = 'https://stub.invalid/token'
+
+    def user_data(self, access_token, *args, **kwargs):
+        if '@' not in access_token:
+            # With the response, social_core looks at its status
+            response = Response()
+            response.status_code = 401
+            response.url = self.ACCESS_TOKEN_URL
+            raise HTTPError('401 Client Error: Unauthorized for url: {0}'.format(self.ACCESS_TOKEN_URL),
+                            response=response)
+        return {'email': access_token, 'name': access_token.split('@')[0]}
+
+    def get_user_details(self, response):
+        return {'username': response['email'], 'email': response['email'], 'first_name': response['name'],
+                'last_name': ''}
+
+
+@contextmanager
+def stub_oauth2():
+    """
+    Enable the `StubOAuth2` backend (as /auth/stub/) inside the block
+    """
+    backends = tuple(settings.AUTHENTICATION_BACKENDS) + ('account.benchmarks.oauth2.StubOAuth2',)
+    try:
+        # social_django reads the backends once at import time, and caches the loaded ones
+        with override_settings(AUTHENTICATION_BACKENDS=backends), \
+                mock.patch('social_django.utils.BACKENDS', backends):
+            load_backends(backends, force_load=True)
+            yield
+    finally:
+        load_backends(settings.AUTHENTICATION_BACKENDS, force_load=True)
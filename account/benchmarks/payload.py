@@ -0,0 +1,59 @@
+"""
+Size and rendering time of the account listings of `size` accounts in the usual format (one object per account,
+rendered by the JSONRenderer of the rest framework) compared with the columnar one (one array per field, rendered by
+ColumnarJSONRenderer), with all the fields and with a sparse fieldset (`?fields=`).
+
+The rows are generated in memory like the ones `values()` returns, so only building and rendering the payload is
+measured. The sizes are given as rendered and as compressed by the gzip of the listings
+"""
+from django.contrib.auth.models import User
+from django.utils.text import compress_string
+
+from rest_framework.renderers import JSONRenderer
+
+from account.benchmarks import measure
+from account.renderers import ColumnarJSONRenderer
+from account.seeding import generate_accounts
+from account.views import ACCOUNT_FIELDS, account_list_data, list_columns
+
+# Fields of the sparse fieldset, like a client only showing the IBANs
+SPARSE_FIELDS = ('id', 'iban')
+
+FORMATS = (
+    ('rows', ACCOUNT_FIELDS, False, JSONRenderer),
+    ('columns', ACCOUNT_FIELDS, True, ColumnarJSONRenderer),
+    ('sparse_rows', SPARSE_FIELDS, False, JSONRenderer),
+    ('sparse_columns', SPARSE_FIELDS, True, ColumnarJSONRenderer),
+)
+
+
+def _rows(size, creators):
+    rows = []
+    for account_id, account in enumerate(generate_accounts(size, creators), 1):
+        account.id = account_id
+        rows.append({
+            'id': account.id, 'first_name': account.first_name, 'last_name': account.last_name,
+            'iban': account.iban, 'version': account.version, 'creator_id': account.creator_id,
+        })
+    return rows
+
+
+def run(sizes, repeat):
+    # Never saved, only their ids are used
+    user, other = User(pk=1), User(pk=2)
+    results = []
+    for size in sizes:
+        all_rows = _rows(size, [user, other])
+        result = {'size': size}
+        for name, fields, columnar, renderer_class in FORMATS:
+            columns = list_columns(fields)
+            rows = [{column: row[column] for column in columns} for row in all_rows]
+            renderer = renderer_class()
+
+            def render():
+                return renderer.render(account_list_data(rows, user, fields, columnar))
+
+            content = render()
+            result[name] = dict(measure(render, repeat), bytes=len(content), gzip_bytes=len(compress_string(content)))
+        results.append(result)
+    return results
@@ -0,0 +1,138 @@
+"""
+Throughput and latency of the production server (gunicorn with gunicorn.conf.py) compared with the development one
+(`runserver`), serving the first page of the accounts to CONCURRENCY clients with keep-alive connections.
+
+Unlike the other benchmarks, the servers run in their own processes and only see committed data: the users, token
+and accounts it creates are committed, and deleted at the end
+"""
+import http.client
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.urls import reverse
+
+from rest_framework.authtoken.models import Token
+
+from account.benchmarks import create_accounts, percentile
+
+# Clients sending requests at the same time, each one `repeat` times
+CONCURRENCY = 8
+
+# Seconds to wait for a server to answer before giving up
+STARTUP_TIMEOUT = 30
+
+SERVERS = {
+    'runserver': lambda address: [sys.executable, 'manage.py', 'runserver', '--noreload', address],
+    'gunicorn': lambda address: [sys.executable, '-m', 'gunicorn', '--bind', address, 'usersmanagement.wsgi'],
+}
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _get(connection, path, token):
+    # Using one of the allowed hosts
+    connection.request('GET', path, headers={'Host': 'localhost', 'Authorization': 'Token ' + token})
+    response = connection.getresponse()
+    response.read()
+    return response.status
+
+
+@contextmanager
+def _serving(command, port, path, token):
+    """
+    Run the server until the block ends, once it answers the requests
+    """
+    # From the project folder, where manage.py and gunicorn.conf.py are, with the settings of this process
+    environment = dict(os.environ, DJANGO_SETTINGS_MODULE=settings.SETTINGS_MODULE)
+    process = subprocess.Popen(command('127.0.0.1:{0}'.format(port)), cwd=settings.BASE_DIR, env=environment,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        deadline = time.monotonic() + STARTUP_TIMEOUT
+        while True:
+            assert process.poll() is None, 'The server exited with {0}'.format(process.returncode)
+            try:
+                if _get(http.client.HTTPConnection('127.0.0.1', port, timeout=5), path, token) == 200:
+                    break
+            except OSError:
+                pass
+            assert time.monotonic() < deadline, 'The server did not start in {0}s'.format(STARTUP_TIMEOUT)
+            time.sleep(0.2)
+        yield
+    finally:
+        process.terminate()
+        try:
+            process.wait(10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+
+def _load(port, path, token, repeat):
+    """
+    Send `repeat` requests from each of the CONCURRENCY clients, returning the throughput and the latencies
+    """
+    durations = []
+    errors = []
+    start_barrier = threading.Barrier(CONCURRENCY + 1)
+
+    def client():
+        connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        start_barrier.wait()
+        for _ in range(repeat):
+            start = time.perf_counter()
+            try:
+                failed = _get(connection, path, token) != 200
+            except (OSError, http.client.HTTPException):
+                # The server closed the connection (e.g. a worker restarted), like a real client would do
+                connection.close()
+                failed = True
+            durations.append((time.perf_counter() - start) * 1000)
+            if failed:
+                errors.append(1)
+        connection.close()
+
+    threads = [threading.Thread(target=client) for _ in range(CONCURRENCY)]
+    for thread in threads:
+        thread.start()
+    start_barrier.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    return {
+        'requests_per_s': round(len(durations) / elapsed, 1),
+        'p50_ms': round(percentile(durations, 50), 3),
+        'p95_ms': round(percentile(durations, 95), 3),
+        'errors': len(errors),
+    }
+
+
+def run(sizes, repeat):
+    results = []
+    path = reverse('accounts:accounts_page')
+    for size in sizes:
+        users = create_accounts(size)
+        try:
+            token = Token.objects.create(user=users[0]).key
+            result = {'size': size}
+            for name, command in SERVERS.items():
+                port = _free_port()
+                with _serving(command, port, path, token):
+                    # Not measuring the first requests of every thread/worker
+                    _load(port, path, token, 1)
+                    result[name] = _load(port, path, token, repeat)
+            results.append(result)
+        finally:
+            for user in users:
+                user.delete()
+    return results
@@ -0,0 +1,167 @@
+import hashlib
+import random
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models import Count, Max, Sum
+
+from account.models import Account
+from account.routers import reading_replicas, use_primary
+
+# Key holding the global accounts version of each database, replaced on every modification of the accounts
+VERSION_KEY = 'accounts:version:{0}'
+
+# Columns shared by all the users in the accounts listing, `is_editable` is added per user
+SHARED_FIELDS = ('id', 'first_name', 'last_name', 'iban', 'version')
+
+# Last rows read by this process, to skip unpickling them from the cache while the version does not change
+_local = {'entry': (None, None)}
+
+
+# Cache backends which are not shared by the processes: each one keeps its own entries (or none at all)
+UNSHARED_BACKENDS = (LocMemCache, DummyCache)
+
+
+def shared_cache(alias):
+    """
+    Return the cache of the alias, which must be shared by all the processes: a write served by one of them has to
+    invalidate what all the others cached
+    """
+    cache = caches[alias]
+    if isinstance(cache, UNSHARED_BACKENDS):
+        raise ImproperlyConfigured(
+            'The cache {0!r} ({1}) is not shared by the processes, use a file based, database or memcached one'.format(
+                alias, type(cache).__name__))
+    return cache
+
+
+def _cache():
+    return shared_cache(getattr(settings, 'ACCOUNTS_CACHE', 'shared'))
+
+
+def _version_key():
+    # Per database, the processes sharing the cache with another one (like the tests) never read its entries
+    name = str(connections[DEFAULT_DB_ALIAS].settings_dict['NAME'])
+    return VERSION_KEY.format(hashlib.sha1(name.encode()).hexdigest()[:12])
+
+
+def _timeout():
+    return getattr(settings, 'ACCOUNTS_CACHE_TIMEOUT', 3600)
+
+
+def accounts_version():
+    """
+    Return the current accounts version, initializing it if it is not in the cache
+    """
+    cache = _cache()
+    key = _version_key()
+    version = cache.get(key)
+    if version is None:
+        # Starting from a random value, so entries cached (or kept by the processes) with a version lost by the
+        # cache are never reused
+        cache.add(key, random.getrandbits(53), None)
+        version = cache.get(key)
+    return version
+
+
+def bump_accounts_version(**kwargs):
+    """
+    Invalidate all the cached listings, replacing the accounts version with a new random one.
+
+    Not incremented, `incr` is a read and a write in the file based and database caches: two concurrent bumps could
+    both end in the same version, keeping the listing read between them
+    """
+    _cache().set(_version_key(), random.getrandbits(53), None)
+
+
+def shared_account_rows(version=None):
+    """
+    Return the part of the accounts listing which is the same for every user
+    """
+    if version is None:
+        version = accounts_version()
+    local_version, local_rows = _local['entry']
+    if local_version == version:
+        return local_rows
+
+    cache = _cache()
+    key = 'accounts:rows:{0}'.format(version)
+    rows = cache.get(key)
+    if rows is None:
+        # Always from the primary, rows from a lagging replica would be kept for the whole version
+        with use_primary():
+            rows = list(Account.objects.order_by('id').values(*SHARED_FIELDS))
+        cache.set(key, rows, _timeout())
+    _local['entry'] = (version, rows)
+    return rows
+
+
+def owned_account_ids(user, version=None):
+    """
+    Return the ids of the accounts created by the user, the ones the user can modify/delete
+    """
+    if version is None:
+        version = accounts_version()
+    cache = _cache()
+    key = 'accounts:owned:{0}:{1}'.format(version, user.pk)
+    ids = cache.get(key)
+    if ids is None:
+        with use_primary():
+            ids = frozenset(Account.objects.filter(creator_id=user.pk).values_list('id', flat=True))
+        cache.set(key, ids, _timeout())
+    return ids
+
+
+def cached_account_rows(user):
+    """
+    Return the rows shared by all the users and the ids of the accounts of the user, from the cache
+    """
+    version = accounts_version()
+    return shared_account_rows(version), owned_account_ids(user, version)
+
+
+def cached_account_list(user):
+    """
+    Build the accounts listing for the user from the cache, only querying the database when the accounts changed
+    """
+    rows, owned = cached_account_rows(user)
+    return [dict(row, is_editable=row['id'] in owned) for row in rows]
+
+
+def accounts_marker(version=None):
+    """
+    Return a value which changes whenever any account is created, modified or deleted.
+
+    New accounts always get a higher id, deletions lower the count and modifications increase a version. It is
+    computed with one aggregate query, and cached in the shared cache until the accounts version changes, so a write
+    served by any process changes the ETag in all of them
+    """
+    if version is None:
+        version = accounts_version()
+    cache = _cache()
+    key = 'accounts:marker:{0}'.format(version)
+    marker = cache.get(key)
+    if marker is None:
+        with use_primary():
+            marker = '{max_id}:{count}:{versions}'.format(
+                **Account.objects.aggregate(max_id=Max('id'), count=Count('id'), versions=Sum('version')))
+        cache.set(key, marker, _timeout())
+    return marker
+
+
+def accounts_etag(request, *args, **kwargs):
+    """
+    Strong ETag of the account listings, different per user (because of `is_editable`), query parameters and format.
+
+    None (no ETag) when the listing is read from the replicas, which can be behind the primary the marker is read from
+    """
+    if reading_replicas():
+        return None
+    # The format can also be chosen with the Accept header
+    value = '{0}:{1}:{2}:{3}'.format(accounts_marker(), request.user.pk, request.GET.urlencode(),
+                                     request.META.get('HTTP_ACCEPT', ''))
+    return hashlib.sha1(value.encode()).hexdigest()
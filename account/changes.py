@@ -0,0 +1,73 @@
+import base64
+import json
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from account.models import Account, AccountTombstone
+
+# Format of the times inside the tokens, keeping the microseconds and the time zone
+TIME_FORMAT = '%Y-%m-%dT%H:%M:%S.%f%z'
+
+
+def encode_position(timestamp, account_id):
+    """
+    Build the opaque token of a position in the change feed
+    """
+    value = json.dumps([timestamp.strftime(TIME_FORMAT), account_id])
+    return base64.urlsafe_b64encode(value.encode()).decode()
+
+
+def decode_position(token):
+    """
+    Read the position of a token built by `encode_position`, raising ValueError if it is not valid
+    """
+    try:
+        timestamp, account_id = json.loads(base64.urlsafe_b64decode(token.encode()).decode())
+        timestamp = datetime.strptime(timestamp, TIME_FORMAT)
+    except (TypeError, ValueError, UnicodeError):
+        raise ValueError('Invalid token')
+    if not isinstance(account_id, int):
+        raise ValueError('Invalid token')
+    return timestamp, account_id
+
+
+def _after(queryset, time_field, id_field, position):
+    # Rows strictly after the position in (time, id) order, written as a range on the time so the index is used
+    if position is None:
+        return queryset
+    timestamp, account_id = position
+    return queryset.filter(**{time_field + '__gte': timestamp}).exclude(
+        **{time_field: timestamp, id_field + '__lte': account_id})
+
+
+def changes_since(position, limit, fields):
+    """
+    Return up to `limit` changes after the position, ordered by time, plus the position to continue from and if
+    there are more changes waiting.
+
+    Every change is a tuple (time, account id, account row or None if it was deleted). Changes newer than
+    `ACCOUNTS_CHANGES_SETTLE_SECONDS` are left for the next call, so transactions still being committed when the
+    feed is read are not skipped
+    """
+    until = timezone.now() - timedelta(seconds=getattr(settings, 'ACCOUNTS_CHANGES_SETTLE_SECONDS', 5))
+
+    updated = _after(Account.objects.filter(updated_at__lt=until), 'updated_at', 'id', position)
+    updated = updated.order_by('updated_at', 'id').values('updated_at', *fields)[:limit + 1]
+    deleted = _after(AccountTombstone.objects.filter(deleted_at__lt=until), 'deleted_at', 'account_id', position)
+    deleted = deleted.order_by('deleted_at', 'account_id').values_list('deleted_at', 'account_id')[:limit + 1]
+
+    changes = sorted(
+        [(row['updated_at'], row['id'], row) for row in updated] +
+        [(deleted_at, account_id, None) for deleted_at, account_id in deleted],
+        key=lambda change: change[:2],
+    )
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+    if has_more:
+        position = changes[-1][:2]
+    else:
+        # Everything older than `until` has been returned, the next call can start from there
+        position = (until, 0)
+    return changes, position, has_more
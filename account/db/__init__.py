@@ -0,0 +1,4 @@
+"""
+Database backends adding health checks of the reused connections and an optional in-process connection pool to the
+ones of Django (see `account.db.pool`), used as ENGINE `account.db.postgresql` or `account.db.sqlite3`
+"""
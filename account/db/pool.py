@@ -0,0 +1,254 @@
+import functools
+import os
+import threading
+import time
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class ConnectionPool:
+    """
+    Connections to one database shared by all the threads of the process: up to `max_size` of them are open, the
+    checkouts wait up to `timeout` seconds for one to be returned when all of them are in use.
+
+    The most recently returned connection is reused first, so the extra ones stay idle and are closed after
+    `max_idle` seconds. The ones idle for more than `check_after` seconds are checked (`SELECT 1`) before reusing them
+    """
+    def __init__(self, connect, max_size=10, timeout=5.0, max_idle=300.0, check_after=30.0):
+        self._connect = connect
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.check_after = check_after
+        # Forked processes must not use the connections of their parent
+        self.pid = os.getpid()
+        # Connections not in use with the time they were returned, the most recent last
+        self._idle = []
+        # Connections open, idle or in use
+        self._size = 0
+        self._condition = threading.Condition()
+        self.checkouts = 0
+        self.created = 0
+        self.discarded = 0
+        self.waits = 0
+        self.wait_seconds = 0.0
+        self.timeouts = 0
+
+    @staticmethod
+    def _usable(connection):
+        try:
+            cursor = connection.cursor()
+            cursor.execute('SELECT 1')
+            cursor.close()
+        except Exception:
+            return False
+        return True
+
+    def checkout(self):
+        """
+        Return an idle connection (checked if it was idle for long), or a new one if there is room for it
+        """
+        start = time.monotonic()
+        waited = False
+        while True:
+            with self._condition:
+                if self._idle:
+                    connection, returned_at = self._idle.pop()
+                elif self._size < self.max_size:
+                    connection = None
+                    self._size += 1
+                else:
+                    remaining = start + self.timeout - time.monotonic()
+                    if remaining <= 0:
+                        self.timeouts += 1
+                        raise PoolTimeout('No database connection available after {0}s ({1} in use)'.format(
+                            self.timeout, self.max_size))
+                    if not waited:
+                        waited = True
+                        self.waits += 1
+                    self._condition.wait(remaining)
+                    continue
+
+            if connection is None:
+                # Connecting (like checking below) without holding the lock, the other threads can go on
+                try:
+                    connection = self._connect()
+                except BaseException:
+                    self._forget()
+                    raise
+                with self._condition:
+                    self.created += 1
+                break
+            idle = time.monotonic() - returned_at
+            if idle > self.max_idle or (idle > self.check_after and not self._usable(connection)):
+                self.discard(connection)
+                continue
+            break
+
+        with self._condition:
+            self.checkouts += 1
+            if waited:
+                self.wait_seconds += time.monotonic() - start
+        return connection
+
+    def checkin(self, connection):
+        """
+        Return a connection (without any transaction in progress) to the pool
+        """
+        with self._condition:
+            self._idle.append((connection, time.monotonic()))
+            self._condition.notify()
+
+    def discard(self, connection):
+        """
+        Close a connection taken from the pool instead of returning it, making room for a new one
+        """
+        try:
+            connection.close()
+        except Exception:
+            pass
+        with self._condition:
+            self.discarded += 1
+        self._forget()
+
+    def _forget(self):
+        with self._condition:
+            self._size -= 1
+            self._condition.notify()
+
+    def close_idle(self):
+        """
+        Close all the idle connections
+        """
+        with self._condition:
+            idle, self._idle = self._idle, []
+        for connection, _ in idle:
+            self.discard(connection)
+
+    def stats(self):
+        with self._condition:
+            return {
+                'max_size': self.max_size, 'open': self._size, 'idle': len(self._idle),
+                'in_use': self._size - len(self._idle), 'checkouts': self.checkouts, 'created': self.created,
+                'discarded': self.discarded, 'waits': self.waits, 'wait_seconds': self.wait_seconds,
+                'timeouts': self.timeouts,
+            }
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+# Pools inherited from the parent process, kept referenced so their connections (the ones of the parent) are never
+# closed by the garbage collector of this one
+_inherited = []
+
+
+def pool_config(settings_dict):
+    """
+    Configuration of the pool of a database (its `POOL` setting), None if it has no pool
+    """
+    if not settings_dict.get('POOL'):
+        return None
+    config = {'MAX_SIZE': 10, 'TIMEOUT': 5.0, 'MAX_IDLE': 300.0, 'CHECK_AFTER': 30.0}
+    config.update(settings_dict['POOL'])
+    return config
+
+
+def get_pool(alias, conn_params, config, connect):
+    """
+    Return the pool of the database alias (and connection parameters, which the tests change) in this process,
+    created with the given config and connect function
+    """
+    key = (alias, repr(sorted(conn_params.items())))
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None or pool.pid != os.getpid():
+            if pool is not None:
+                _inherited.append(pool)
+            pool = _pools[key] = ConnectionPool(
+                connect, max_size=config['MAX_SIZE'], timeout=config['TIMEOUT'], max_idle=config['MAX_IDLE'],
+                check_after=config['CHECK_AFTER'])
+        return pool
+
+
+def pool_stats():
+    """
+    Return the counters of the pools of this process per database alias
+    """
+    with _pools_lock:
+        pools = [(alias, pool) for (alias, _), pool in _pools.items() if pool.pid == os.getpid()]
+    return {alias: pool.stats() for alias, pool in sorted(pools, key=lambda item: item[0])}
+
+
+def close_pools():
+    """
+    Close the idle connections of every pool, like before forking the processes which will serve the requests
+    """
+    with _pools_lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        if pool.pid == os.getpid():
+            pool.close_idle()
+
+
+class PooledDatabaseWrapperMixin:
+    """
+    Database wrapper checking the reused connections with `CONN_HEALTH_CHECKS` (like Django 4.1 does): the first time
+    a persistent connection is used in a request, it is closed and opened again if it stopped working (e.g. the server
+    restarted or dropped it). With a `POOL`, the connections are taken from the pool of the process and returned to it
+    when closed, instead of being opened and closed every time
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.health_check_done = False
+        self.pool = None
+
+    def connect(self):
+        super().connect()
+        # New (or checked by the pool) connections need no other check
+        self.health_check_done = True
+
+    def get_new_connection(self, conn_params):
+        config = pool_config(self.settings_dict)
+        if config is None:
+            return super().get_new_connection(conn_params)
+        self.pool = get_pool(self.alias, conn_params, config,
+                             functools.partial(super().get_new_connection, conn_params))
+        try:
+            return self.pool.checkout()
+        except PoolTimeout as e:
+            raise self.Database.OperationalError(str(e)) from e
+
+    def _close(self):
+        if self.pool is None or self.connection is None or self.pool.pid != os.getpid():
+            return super()._close()
+        connection = self.connection
+        # Closed inside a transaction (it is kept until it ends, but unusable) or after errors it may not survive
+        if self.in_atomic_block or (self.errors_occurred and not self.is_usable()):
+            self.pool.discard(connection)
+            return
+        if not self.autocommit:
+            try:
+                connection.rollback()
+            except self.Database.Error:
+                self.pool.discard(connection)
+                return
+        self.pool.checkin(connection)
+
+    def close_if_unusable_or_obsolete(self):
+        super().close_if_unusable_or_obsolete()
+        # At the start and the end of every request, checking it again the next time it is used
+        self.health_check_done = False
+
+    def ensure_connection(self):
+        if (self.connection is not None and not self.health_check_done and not self.in_atomic_block and
+                self.settings_dict.get('CONN_HEALTH_CHECKS')):
+            self.health_check_done = True
+            if not self.is_usable():
+                if self.pool is not None:
+                    self.pool.discard(self.connection)
+                    self.connection = None
+                else:
+                    self.close()
+        super().ensure_connection()
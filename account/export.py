@@ -0,0 +1,76 @@
+import csv
+import json
+
+from django.conf import settings
+
+from account.models import Account
+
+# Columns written for every exported account, in this order
+EXPORT_FIELDS = ('id', 'first_name', 'last_name', 'iban', 'creator_id')
+
+
+class Echo:
+    """
+    File-like object which returns the written value instead of storing it, so csv.writer can be used as a generator
+    """
+    def write(self, value):
+        return value
+
+
+def export_rows(chunk_size=None):
+    """
+    Iterate over all the accounts as tuples of EXPORT_FIELDS.
+
+    `iterator()` uses a server-side cursor on PostgreSQL (and chunked reads on SQLite), so only `chunk_size` rows
+    are held in memory at any time, and the queryset result cache is never filled
+    """
+    if chunk_size is None:
+        chunk_size = getattr(settings, 'ACCOUNTS_EXPORT_CHUNK_SIZE', 2000)
+    return Account.objects.order_by('id').values_list(*EXPORT_FIELDS).iterator(chunk_size=chunk_size)
+
+
+def _grouped(lines, size):
+    # Joining the lines in blocks to avoid writing to the socket once per row
+    block = []
+    for line in lines:
+        block.append(line)
+        if len(block) >= size:
+            yield ''.join(block)
+            block = []
+    if block:
+        yield ''.join(block)
+
+
+def ndjson_lines(rows):
+    """
+    Render each row as one JSON object per line
+    """
+    for row in rows:
+        yield json.dumps(dict(zip(EXPORT_FIELDS, row))) + '\n'
+
+
+def csv_lines(rows):
+    """
+    Render the rows as CSV, starting with a header line
+    """
+    writer = csv.writer(Echo())
+    yield writer.writerow(EXPORT_FIELDS)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+# Available formats, with the function rendering the lines and the content type of the response
+EXPORT_FORMATS = {
+    'ndjson': (ndjson_lines, 'application/x-ndjson'),
+    'csv': (csv_lines, 'text/csv'),
+}
+
+
+def export_accounts(export_format, chunk_size=None):
+    """
+    Generator with the whole accounts table rendered in the given format, yielded in blocks of `chunk_size` rows
+    """
+    if chunk_size is None:
+        chunk_size = getattr(settings, 'ACCOUNTS_EXPORT_CHUNK_SIZE', 2000)
+    render, _ = EXPORT_FORMATS[export_format]
+    return _grouped(render(export_rows(chunk_size)), chunk_size)
@@ -0,0 +1,162 @@
+import csv
+import io
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from account.models import Account
+from account.operations import existing_ibans, insert_batch_size, stored_ibans
+from account.utils import check_iban
+
+# Columns the imported files must have, any other column (like the ones of the export) is ignored
+IMPORT_FIELDS = ('first_name', 'last_name', 'iban')
+
+# Columns written for every rejected row, the line is the one of the input file (the header is line 1)
+REJECT_FIELDS = ('line', 'first_name', 'last_name', 'iban', 'error')
+
+NAME_MAX_LENGTH = Account._meta.get_field('first_name').max_length
+
+
+def read_chunks(lines, chunk_size=None):
+    """
+    Read the CSV lines in lists of (line, first_name, last_name, iban), `chunk_size` rows each, so the input is never
+    fully held in memory
+    """
+    if chunk_size is None:
+        chunk_size = getattr(settings, 'ACCOUNTS_IMPORT_CHUNK_SIZE', 10000)
+    reader = csv.DictReader(lines)
+    missing = set(IMPORT_FIELDS) - set(reader.fieldnames or ())
+    if missing:
+        raise ValueError('Missing columns: {0}'.format(', '.join(sorted(missing))))
+
+    chunk = []
+    for row in reader:
+        chunk.append((reader.line_num, row['first_name'], row['last_name'], row['iban']))
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _name_error(field, value):
+    if not value:
+        return '{0} is required'.format(field)
+    if len(value) > NAME_MAX_LENGTH:
+        return '{0} is too long'.format(field)
+    return None
+
+
+def validate_rows(rows):
+    """
+    Split a chunk of rows into the valid ones (with the names stripped and the IBAN normalized) and the rejected
+    ones, with their error. It does not touch the database, so it can run in other processes
+    """
+    valid = []
+    rejects = []
+    for line, first_name, last_name, iban in rows:
+        first_name, last_name = (first_name or '').strip(), (last_name or '').strip()
+        error = _name_error('first_name', first_name) or _name_error('last_name', last_name)
+        if error is None:
+            result = check_iban(iban or '')
+            iban, error = result.iban, result.error
+        if error is None:
+            valid.append((line, first_name, last_name, iban))
+        else:
+            rejects.append((line, first_name, last_name, iban, error))
+    return valid, rejects
+
+
+def _validated_chunks(chunks, workers):
+    # Validating in a pool of processes when asked, keeping at most two chunks per process in flight so the input
+    # is still read as it is consumed (`Executor.map` would submit all of them at once)
+    if not workers:
+        yield from map(validate_rows, chunks)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(executor.submit(validate_rows, chunk))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def _copy_accounts(rows, creator):
+    """
+    Insert the rows with COPY into a temporary staging table, merged into the accounts skipping the IBANs already
+    stored. Returns the inserted IBANs
+    """
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows((first_name, last_name, iban) for _, first_name, last_name, iban in rows)
+    buffer.seek(0)
+
+    table = connection.ops.quote_name(Account._meta.db_table)
+    with connection.cursor() as cursor:
+        # Dropped at the end of the transaction of the chunk
+        cursor.execute(
+            'CREATE TEMPORARY TABLE account_import (first_name varchar(35), last_name varchar(35), iban varchar(34)) '
+            'ON COMMIT DROP'
+        )
+        cursor.copy_expert('COPY account_import (first_name, last_name, iban) FROM STDIN WITH (FORMAT csv)', buffer)
+        cursor.execute(
+            'INSERT INTO {0} (first_name, last_name, iban, creator_id, version, updated_at) '
+            'SELECT first_name, last_name, iban, %s, 1, %s FROM account_import '
+            'ON CONFLICT (iban) DO NOTHING RETURNING iban'.format(table),
+            [creator.pk, timezone.now()],
+        )
+        return {iban for iban, in cursor.fetchall()}
+
+
+def _bulk_create_accounts(rows, creator, batch_size):
+    """
+    Insert the rows with `bulk_create`, skipping the IBANs already stored. Returns the inserted IBANs
+    """
+    taken = existing_ibans(iban for _, _, _, iban in rows)
+    accounts = {}
+    for _, first_name, last_name, iban in rows:
+        if iban not in taken and iban not in accounts:
+            accounts[iban] = Account(first_name=first_name, last_name=last_name, iban=iban, creator=creator)
+    accounts = list(accounts.values())
+    # Ignoring the conflicts with the accounts created in the meantime by other requests
+    Account.objects.bulk_create(accounts, batch_size=insert_batch_size(accounts, batch_size), ignore_conflicts=True)
+    # The database does not tell which rows those conflicts skipped, they are the ones not stored with our data
+    return stored_ibans(accounts)
+
+
+def import_accounts(lines, creator, rejects=None, chunk_size=None, workers=0, batch_size=None):
+    """
+    Import the accounts of the CSV lines for the given creator, chunk by chunk, each one in its own transaction.
+
+    Rows not valid or whose IBAN already exists are written to the `rejects` CSV writer, if given. Yields the
+    cumulative (read, imported, rejected) counts after every chunk
+    """
+    if batch_size is None:
+        batch_size = getattr(settings, 'ACCOUNTS_BULK_BATCH_SIZE', 1000)
+
+    read = imported = rejected = 0
+    for valid, invalid in _validated_chunks(read_chunks(lines, chunk_size), workers):
+        with transaction.atomic():
+            if connection.vendor == 'postgresql':
+                inserted = _copy_accounts(valid, creator)
+            else:
+                inserted = _bulk_create_accounts(valid, creator, batch_size)
+
+        # Every inserted IBAN accounts for its first row, the rest of them were already stored (or repeated)
+        for line, first_name, last_name, iban in valid:
+            if iban in inserted:
+                inserted.discard(iban)
+                imported += 1
+            else:
+                invalid.append((line, first_name, last_name, iban, 'iban already exists'))
+
+        rejected += len(invalid)
+        read = imported + rejected
+        if rejects is not None:
+            rejects.writerows(sorted(invalid))
+        yield read, imported, rejected
@@ -0,0 +1,44 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from account.benchmarks import BENCHMARKS, BUDGETS_FILE, check_budgets, load
+
+
+class Command(BaseCommand):
+    help = 'Run the account benchmarks, printing (or saving) the measurements as JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('names', nargs='*', help='Benchmarks to run, all of them if not given: {0}'.format(
+            ', '.join(BENCHMARKS)))
+        parser.add_argument('--sizes', default='1000,10000',
+                            help='Comma separated number of accounts used by the benchmarks')
+        parser.add_argument('--repeat', type=int, default=20, help='Times each measurement is repeated')
+        parser.add_argument('--output', default=None, help='JSON file to save the results to')
+        parser.add_argument('--budgets', nargs='?', const=BUDGETS_FILE, default=None,
+                            help='Fail if any measurement exceeds the budgets of this JSON file (the checked-in '
+                                 'account/benchmarks/budgets.json if no file is given)')
+
+    def handle(self, *args, **options):
+        names = options['names'] or BENCHMARKS
+        unknown = set(names) - set(BENCHMARKS)
+        if unknown:
+            raise CommandError('Unknown benchmarks: {0}'.format(', '.join(sorted(unknown))))
+        sizes = [int(size) for size in options['sizes'].split(',')]
+
+        results = {}
+        for name in names:
+            self.stderr.write('Running {0}...'.format(name))
+            results[name] = load(name).run(sizes, options['repeat'])
+
+        output = json.dumps(results, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output)
+        self.stdout.write(output)
+
+        if options['budgets']:
+            with open(options['budgets']) as f:
+                exceeded = check_budgets(results, json.load(f))
+            if exceeded:
+                raise CommandError('Budgets exceeded:\n{0}'.format('\n'.join(exceeded)))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from account.export import EXPORT_FORMATS, export_accounts
+
+
+class Command(BaseCommand):
+    help = 'Stream all the accounts as NDJSON or CSV, keeping the memory usage constant whatever the table size'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=sorted(EXPORT_FORMATS), default='ndjson', dest='export_format')
+        parser.add_argument('--chunk-size', type=int, default=None,
+                            help='Rows fetched from the database per round trip (ACCOUNTS_EXPORT_CHUNK_SIZE)')
+        parser.add_argument('--output', default=None, help='File to write to, standard output if not given')
+
+    def handle(self, *args, **options):
+        blocks = export_accounts(options['export_format'], options['chunk_size'])
+        if options['output']:
+            with open(options['output'], 'w', newline='') as output:
+                for block in blocks:
+                    output.write(block)
+        else:
+            for block in blocks:
+                self.stdout.write(block, ending='')
@@ -0,0 +1,61 @@
+import csv
+import sys
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from account.imports import REJECT_FIELDS, import_accounts
+from account.models import Account
+from account.signals import accounts_changed
+
+
+class Command(BaseCommand):
+    help = ('Import the accounts of a CSV file (first_name, last_name and iban columns) in chunks, writing the rows '
+            'not imported to a rejects file')
+
+    def add_arguments(self, parser):
+        parser.add_argument('input', help='CSV file to read from, - for standard input')
+        parser.add_argument('--creator', required=True, help='Username of the creator of the imported accounts')
+        parser.add_argument('--rejects', default=None,
+                            help='CSV file to write the rows not imported to, <input>.rejects.csv if not given')
+        parser.add_argument('--chunk-size', type=int, default=None,
+                            help='Rows validated and inserted at once (ACCOUNTS_IMPORT_CHUNK_SIZE)')
+        parser.add_argument('--workers', type=int, default=0,
+                            help='Processes validating the chunks, validating them in this process if 0')
+
+    def handle(self, *args, **options):
+        try:
+            creator = User.objects.get(username=options['creator'])
+        except User.DoesNotExist:
+            raise CommandError('User "{0}" does not exist'.format(options['creator']))
+
+        rejects_path = options['rejects']
+        if rejects_path is None:
+            rejects_path = 'rejects.csv' if options['input'] == '-' else options['input'] + '.rejects.csv'
+
+        if options['input'] == '-':
+            source = sys.stdin
+        else:
+            source = open(options['input'], newline='', encoding='utf-8')
+
+        start = time.perf_counter()
+        read = imported = rejected = 0
+        try:
+            with source, open(rejects_path, 'w', newline='') as rejects_file:
+                rejects = csv.writer(rejects_file)
+                rejects.writerow(REJECT_FIELDS)
+                progress = import_accounts(source, creator, rejects, options['chunk_size'], options['workers'])
+                for read, imported, rejected in progress:
+                    self.stderr.write('{0} rows read, {1} imported, {2} rejected ({3:.0f} rows/s)'.format(
+                        read, imported, rejected, read / (time.perf_counter() - start)))
+        except ValueError as e:
+            raise CommandError(e)
+        finally:
+            # Every chunk is committed on its own, so the listings must be refreshed even if it failed halfway
+            if imported:
+                accounts_changed.send(sender=Account)
+
+        elapsed = time.perf_counter() - start
+        self.stdout.write('{0} rows read, {1} imported, {2} rejected (written to {3}) in {4:.1f}s, {5:.0f} rows/s'
+                          .format(read, imported, rejected, rejects_path, elapsed, read / elapsed if elapsed else 0))
@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from account.authentication import purge_expired_tokens
+
+
+class Command(BaseCommand):
+    help = ('Delete the tokens not used in the last TOKEN_EXPIRY["LIFETIME"] seconds, in small batches so the table '
+            'is never locked for long')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Tokens deleted per transaction')
+        parser.add_argument('--pause', type=float, default=0.0, help='Seconds to wait between two batches')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1 or options['pause'] < 0:
+            raise CommandError('--batch-size must be positive and --pause not negative')
+
+        start = time.perf_counter()
+        deleted = 0
+        for deleted in purge_expired_tokens(options['batch_size'], options['pause']):
+            self.stderr.write('{0} tokens deleted'.format(deleted))
+        self.stdout.write('{0} expired tokens deleted in {1:.1f}s'.format(deleted, time.perf_counter() - start))
@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from account.models import Account
+from account.seeding import seed_accounts, seed_creators
+from account.signals import accounts_changed
+
+
+class Command(BaseCommand):
+    help = ('Fill the database with generated accounts (realistic names and valid IBANs of several countries), always '
+            'the same ones for a given seed')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, required=True, help='Number of accounts to generate')
+        parser.add_argument('--creators', type=int, default=10,
+                            help='Number of users (seed-0, seed-1...) the accounts are spread among')
+        parser.add_argument('--seed', type=int, default=0, help='Seed of the random generator')
+        parser.add_argument('--chunk-size', type=int, default=None,
+                            help='Accounts inserted per transaction (ACCOUNTS_IMPORT_CHUNK_SIZE)')
+
+    def handle(self, *args, **options):
+        if options['count'] < 1 or options['creators'] < 1:
+            raise CommandError('--count and --creators must be positive')
+
+        before = Account.objects.count()
+        creators = seed_creators(options['creators'])
+        start = time.perf_counter()
+        generated = 0
+        try:
+            for generated in seed_accounts(options['count'], creators, options['seed'], options['chunk_size']):
+                self.stderr.write('{0} accounts generated ({1:.0f} rows/s)'.format(
+                    generated, generated / (time.perf_counter() - start)))
+        finally:
+            # Every chunk is committed on its own, so the listings must be refreshed even if it failed halfway
+            if generated:
+                accounts_changed.send(sender=Account)
+
+        created = Account.objects.count() - before
+        self.stdout.write('{0} accounts generated, {1} created ({2} already existed) in {3:.1f}s'.format(
+            generated, created, generated - created, time.perf_counter() - start))
@@ -0,0 +1,196 @@
+import threading
+import time
+from bisect import bisect_left
+
+from django.db import connections
+
+from account.db.pool import pool_stats
+
+# Upper bounds (in seconds) of the buckets of the latency histogram, the last bucket (+Inf) is implicit
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Positions of the counters kept per view, followed by the count of every latency bucket
+COUNT, DURATION, QUERIES, DB_DURATION, RESPONSE_BYTES, BUCKETS = range(6)
+
+# Metrics of the connection pools (name, type, help and key of the pool stats), only when there are pools
+POOL_METRICS = (
+    ('db_pool_max_connections', 'gauge', 'Maximum connections of the pool.', 'max_size'),
+    ('db_pool_in_use_connections', 'gauge', 'Connections of the pool in use.', 'in_use'),
+    ('db_pool_idle_connections', 'gauge', 'Connections of the pool waiting to be used.', 'idle'),
+    ('db_pool_checkouts_total', 'counter', 'Connections taken from the pool.', 'checkouts'),
+    ('db_pool_created_total', 'counter', 'Connections opened by the pool.', 'created'),
+    ('db_pool_discarded_total', 'counter', 'Connections closed by the pool (broken or idle for long).', 'discarded'),
+    ('db_pool_waits_total', 'counter', 'Checkouts which waited for a connection.', 'waits'),
+    ('db_pool_wait_seconds_total', 'counter', 'Time spent waiting for a connection.', 'wait_seconds'),
+    ('db_pool_timeouts_total', 'counter', 'Checkouts which gave up waiting for a connection.', 'timeouts'),
+)
+
+# View name used for the requests not resolved to any view (like the 404 responses)
+UNMATCHED = 'unmatched'
+
+
+class _Store:
+    """
+    Counters of the requests served by one thread. Only that thread writes them, so no lock is needed, and the
+    scrapes just add up the stores of all the threads (reading them while they change only skews one request)
+    """
+    def __init__(self):
+        self.thread = threading.current_thread()
+        self.views = {}
+        # Queries done by the request being served, counted by the execute wrapper
+        self.queries = 0
+        self.db_duration = 0.0
+        # Databases whose connection (the one of this thread) already calls the store as execute wrapper
+        self.aliases = set()
+
+    def install(self):
+        """
+        Add the store to the execute wrappers of the connections of this thread to every database (the replicas too)
+        which do not have it yet. It stays there for the life of the thread, the queries done outside the requests
+        are discarded when the next request resets the counters
+        """
+        for alias in connections:
+            if alias not in self.aliases:
+                connections[alias].execute_wrappers.append(self)
+        self.aliases = set(connections)
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_duration += time.perf_counter() - start
+            self.queries += 1
+
+    def counters(self, view):
+        counters = self.views.get(view)
+        if counters is None:
+            # Once per view and thread, the following requests only increase the counters
+            counters = self.views[view] = [0, 0.0, 0, 0.0, 0] + [0] * (len(LATENCY_BUCKETS) + 1)
+        return counters
+
+
+_local = threading.local()
+_stores = []
+_stores_lock = threading.Lock()
+# Counters of the threads already finished (like the ones of the development server, one per request)
+_retired = {}
+
+
+def _retire_finished():
+    # Called holding the lock. Keeping the counters of the finished threads, but not their stores
+    finished = [store for store in _stores if not store.thread.is_alive()]
+    for store in finished:
+        _stores.remove(store)
+        _add(_retired, store.views)
+
+
+def _store():
+    try:
+        return _local.store
+    except AttributeError:
+        store = _local.store = _Store()
+        with _stores_lock:
+            # A new thread is the time to forget the finished ones, which are never reused (like the ones of the
+            # development server, one per request)
+            _retire_finished()
+            _stores.append(store)
+        store.install()
+        return store
+
+
+def _add(totals, views):
+    for view, counters in views.items():
+        current = totals.get(view)
+        if current is None:
+            totals[view] = list(counters)
+        else:
+            for index, value in enumerate(counters):
+                current[index] += value
+
+
+def snapshot():
+    """
+    Return the counters of every view added up for all the threads of this process
+    """
+    with _stores_lock:
+        _retire_finished()
+        totals = {}
+        _add(totals, _retired)
+        for store in _stores:
+            _add(totals, dict(store.views))
+    return totals
+
+
+class MetricsMiddleware:
+    """
+    Record per view (URL name) the number of requests, a latency histogram, the number of queries and the time spent
+    in the database, and the size of the responses
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        store = _store()
+        # Only the databases configured after the store was created (like the replicas of the tests) need it
+        if store.aliases != connections.databases.keys():
+            store.install()
+        store.queries = 0
+        store.db_duration = 0.0
+        start = time.perf_counter()
+        response = self.get_response(request)
+        duration = time.perf_counter() - start
+
+        match = request.resolver_match
+        counters = store.counters(match.view_name if match is not None else UNMATCHED)
+        counters[COUNT] += 1
+        counters[DURATION] += duration
+        counters[QUERIES] += store.queries
+        counters[DB_DURATION] += store.db_duration
+        if not response.streaming:
+            counters[RESPONSE_BYTES] += len(response.content)
+        counters[BUCKETS + bisect_left(LATENCY_BUCKETS, duration)] += 1
+        return response
+
+
+def _labels(view, **extra):
+    labels = ['view="{0}"'.format(view.replace('\\', '\\\\').replace('"', '\\"'))]
+    labels.extend('{0}="{1}"'.format(key, value) for key, value in extra.items())
+    return '{' + ','.join(labels) + '}'
+
+
+def render_metrics(totals=None):
+    """
+    Render the counters in the Prometheus text exposition format
+    """
+    if totals is None:
+        totals = snapshot()
+    views = sorted(totals)
+    lines = []
+
+    def counter(name, help_text, index):
+        lines.append('# HELP {0} {1}'.format(name, help_text))
+        lines.append('# TYPE {0} counter'.format(name))
+        lines.extend('{0}{1} {2}'.format(name, _labels(view), totals[view][index]) for view in views)
+
+    counter('http_requests_total', 'Requests served.', COUNT)
+    lines.append('# HELP http_request_duration_seconds Time spent serving the requests.')
+    lines.append('# TYPE http_request_duration_seconds histogram')
+    for view in views:
+        counters = totals[view]
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS + ('+Inf',), counters[BUCKETS:]):
+            cumulative += count
+            lines.append('http_request_duration_seconds_bucket{0} {1}'.format(_labels(view, le=bound), cumulative))
+        lines.append('http_request_duration_seconds_sum{0} {1}'.format(_labels(view), counters[DURATION]))
+        lines.append('http_request_duration_seconds_count{0} {1}'.format(_labels(view), counters[COUNT]))
+    counter('db_queries_total', 'Database queries done while serving the requests.', QUERIES)
+    counter('db_query_duration_seconds_total', 'Time spent in the database while serving the requests.', DB_DURATION)
+    counter('http_response_size_bytes_total', 'Size of the (not streamed) response bodies.', RESPONSE_BYTES)
+
+    pools = pool_stats()
+    for name, metric_type, help_text, key in POOL_METRICS if pools else ():
+        lines.append('# HELP {0} {1}'.format(name, help_text))
+        lines.append('# TYPE {0} {1}'.format(name, metric_type))
+        lines.extend('{0}{{database="{1}"}} {2}'.format(name, alias, stats[key]) for alias, stats in pools.items())
+    return '\n'.join(lines) + '\n'
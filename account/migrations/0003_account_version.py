@@ -0,0 +1,18 @@
+# Generated by Django 2.2.13 on 2026-10-18 07:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0002_auto_20190930_1420'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='account',
+            name='version',
+            field=models.PositiveIntegerField(default=1),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 2.2.13 on 2026-10-18 07:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0003_account_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AccountTombstone',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('account_id', models.IntegerField()),
+                ('deleted_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='account',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name='account',
+            index=models.Index(fields=['updated_at', 'id'], name='account_acc_updated_002c52_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='accounttombstone',
+            index=models.Index(fields=['deleted_at', 'account_id'], name='account_acc_deleted_7fe825_idx'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+from django.db import migrations
+
+# Indexes used by the accounts search, the names are searched by prefix and not case sensitive
+# PostgreSQL: Django filters on UPPER(name) LIKE 'PREFIX%', pattern_ops allows using the index whatever the collation
+# SQLite: LIKE is not case sensitive by default, and it only uses indexes with the same collation
+INDEXES = {
+    'postgresql': [
+        'CREATE INDEX account_first_name_search_idx ON account_account (UPPER(first_name) text_pattern_ops)',
+        'CREATE INDEX account_last_name_search_idx ON account_account (UPPER(last_name) text_pattern_ops)',
+    ],
+    'sqlite': [
+        'CREATE INDEX account_first_name_search_idx ON account_account (first_name COLLATE NOCASE)',
+        'CREATE INDEX account_last_name_search_idx ON account_account (last_name COLLATE NOCASE)',
+    ],
+}
+
+DROP_INDEXES = [
+    'DROP INDEX account_first_name_search_idx',
+    'DROP INDEX account_last_name_search_idx',
+]
+
+
+def create_indexes(apps, schema_editor):
+    for statement in INDEXES.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(statement)
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor in INDEXES:
+        for statement in DROP_INDEXES:
+            schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0004_account_changes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
@@ -0,0 +1,39 @@
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+# SQLite can not drop the index of a column, Django rebuilds the whole table instead and only recreates the indexes
+# it knows about, losing the search indexes created with SQL in 0005
+SQLITE_SEARCH_INDEXES = [
+    'CREATE INDEX IF NOT EXISTS account_first_name_search_idx ON account_account (first_name COLLATE NOCASE)',
+    'CREATE INDEX IF NOT EXISTS account_last_name_search_idx ON account_account (last_name COLLATE NOCASE)',
+]
+
+
+def restore_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        for statement in SQLITE_SEARCH_INDEXES:
+            schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0005_account_search_indexes'),
+    ]
+
+    operations = [
+        # Reversed last, after the table is rebuilt again with the index of the creator
+        migrations.RunPython(migrations.RunPython.noop, restore_search_indexes),
+        # The (creator, id) index also serves the lookups by creator alone, no need to keep both
+        migrations.AlterField(
+            model_name='account',
+            name='creator',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='creator', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='account',
+            index=models.Index(fields=['creator', 'id'], name='account_acc_creator_183bde_idx'),
+        ),
+        migrations.RunPython(restore_search_indexes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0006_account_creator_index'),
+        ('authtoken', '0002_auto_20160226_1747'),
+    ]
+
+    operations = [
+        # Finding the expired tokens to purge without reading the whole table
+        migrations.RunSQL(
+            'CREATE INDEX account_token_created_idx ON authtoken_token (created)',
+            'DROP INDEX account_token_created_idx',
+        ),
+    ]
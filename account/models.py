@@ -21,8 +21,52 @@ class Account(models.Model):
     iban = models.CharField(max_length=34, null=False, blank=False, unique=True)
 
     # Field to manage who created the user to restrict the permissions
-    creator = models.ForeignKey(User, related_name="creator", null=False, blank=False, on_delete=models.CASCADE)
+    # Not indexed alone, the (creator, id) index below already serves the lookups by creator
+    creator = models.ForeignKey(User, related_name="creator", null=False, blank=False, on_delete=models.CASCADE,
+                                db_index=False)
+
+    # Increased on every modification, used to detect concurrent modifications (optimistic concurrency)
+    version = models.PositiveIntegerField(default=1)
+
+    # Last creation/modification time, used by the clients synchronising the changes (the change feed)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Walking the changes in order, from a given position
+            models.Index(fields=['updated_at', 'id']),
+            # Listing the accounts of one creator in order, page by page
+            models.Index(fields=['creator', 'id']),
+        ]
+
+    def save(self, *args, **kwargs):
+        # Changes done through the model (like in Administration page) also move the version forward
+        if not self._state.adding:
+            self.version += 1
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = set(kwargs['update_fields']) | {'version', 'updated_at'}
+        super().save(*args, **kwargs)
 
     # Returning first name + last name to have a nice view in Administration page
     def __str__(self):
         return '{0} {1} - {2}'.format(self.first_name, self.last_name, self.iban)
+
+
+"""
+    AccountTombstone keeps the deleted accounts, so the clients synchronising the changes can remove them as well
+"""
+
+
+class AccountTombstone(models.Model):
+    # Id the account had, it is never reused by a new account
+    account_id = models.IntegerField()
+
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['deleted_at', 'account_id']),
+        ]
+
+    def __str__(self):
+        return '{0} - {1}'.format(self.account_id, self.deleted_at)
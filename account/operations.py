@@ -0,0 +1,296 @@
+from itertools import groupby
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from rest_framework import serializers
+
+from account.models import Account, AccountTombstone
+from account.serializers import AccountDataSerializer, AccountOperationSerializer
+
+# Results of the creations, modifications and deletions
+CREATED = 'created'
+UPDATED = 'updated'
+DELETED = 'deleted'
+NOT_FOUND = 'not_found'
+NO_PERMISSION = 'no_permission'
+CONFLICT = 'conflict'
+ERROR = 'error'
+
+# Results of the operations of a batch not done because another one failed (only when it is all or nothing)
+SKIPPED = 'skipped'
+ROLLED_BACK = 'rolled_back'
+
+# Fields that the creator of an account is allowed to modify
+EDITABLE_FIELDS = ('first_name', 'last_name', 'iban')
+
+
+def _chunks(values):
+    # Split the values of an `__in` lookup if the database backend limits the number of parameters per query
+    values = list(values)
+    size = connection.features.max_query_params or len(values) or 1
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def iban_owners(ibans):
+    """
+    Return the id of the account which has each of the given IBANs, for the ones already stored
+    """
+    owners = {}
+    for chunk in _chunks(ibans):
+        owners.update(Account.objects.filter(iban__in=chunk).values_list('iban', 'id'))
+    return owners
+
+
+def stored_ibans(accounts):
+    """
+    Return the IBANs of the given accounts which are stored with their same creator and names, telling the inserted
+    ones apart from the ones skipped because another account got their IBAN first
+    """
+    expected = {account.iban: (account.creator_id, account.first_name, account.last_name) for account in accounts}
+    stored = set()
+    for chunk in _chunks(expected):
+        rows = Account.objects.filter(iban__in=chunk).values_list('iban', 'creator_id', 'first_name', 'last_name')
+        stored.update(iban for iban, *data in rows if expected[iban] == tuple(data))
+    return stored
+
+
+def existing_ibans(ibans):
+    """
+    Return which of the given IBANs are already stored, with one `iban__in` query (split only if the database
+    backend limits the number of parameters per query, like SQLite)
+    """
+    return set(iban_owners(ibans))
+
+
+def insert_batch_size(accounts, batch_size):
+    """
+    Rows per INSERT for `bulk_create`, capped by what the database backend supports (Django 2.2 does not cap a
+    given batch size, and SQLite rejects statements with too many rows)
+    """
+    fields = [field for field in Account._meta.concrete_fields if not field.primary_key]
+    return max(1, min(batch_size, connection.ops.bulk_batch_size(fields, accounts)))
+
+
+def bulk_create_accounts(items, creator, batch_size=None):
+    """
+    Validate and create several accounts at once for the given creator.
+
+    Returns one result per item, in the same order, with the `status` ('created' or 'error') of each of them.
+    Valid accounts are inserted inside one transaction with `bulk_create`, in batches of `batch_size` rows
+    """
+    if batch_size is None:
+        batch_size = getattr(settings, 'ACCOUNTS_BULK_BATCH_SIZE', 1000)
+
+    # Same validator instance for all the items, avoiding to build the serializer fields once per item
+    validator = AccountDataSerializer()
+    results = [None] * len(items)
+    valid = []
+    for index, item in enumerate(items):
+        try:
+            valid.append((index, validator.run_validation(item)))
+        except serializers.ValidationError as e:
+            results[index] = {'index': index, 'status': ERROR, 'errors': e.detail}
+
+    with transaction.atomic():
+        for index, result in _create(valid, creator, batch_size):
+            results[index] = dict(result, index=index)
+    return results
+
+
+def _create(valid, creator, batch_size):
+    """
+    Insert the validated accounts, given as (index, data) pairs, returning the (index, result) pairs
+    """
+    # Checking all the IBANs against the database at once, and against the other items of the same request
+    taken = existing_ibans(data['iban'] for _, data in valid)
+    results = []
+    pending = []
+    for index, data in valid:
+        if data['iban'] in taken:
+            results.append((index, {'status': ERROR, 'errors': {'iban': ['iban already exists']}}))
+        else:
+            taken.add(data['iban'])
+            pending.append((index, Account(creator=creator, **{field: data[field] for field in EDITABLE_FIELDS})))
+
+    accounts = [account for _, account in pending]
+    Account.objects.bulk_create(accounts, batch_size=insert_batch_size(accounts, batch_size))
+
+    # The ids are only known when the database can return them from the insert (PostgreSQL)
+    results.extend((index, {'status': CREATED, 'id': account.pk}) for index, account in pending)
+    return results
+
+
+def _conditions(account_id, creator, version):
+    # Only the creator can modify/delete an account, and only the expected version when it is given
+    conditions = {'id': account_id, 'creator_id': creator.pk}
+    if version is not None:
+        conditions['version'] = version
+    return conditions
+
+
+def _failure(account_id, creator):
+    """
+    Find out why a conditional write did not affect any row, only called when it failed
+    """
+    creator_id = Account.objects.filter(id=account_id).values_list('creator_id', flat=True).first()
+    if creator_id is None:
+        return NOT_FOUND
+    if creator_id != creator.pk:
+        return NO_PERMISSION
+    return CONFLICT
+
+
+def update_account(account_id, creator, data, version=None):
+    """
+    Modify the given fields of an account with one conditional UPDATE, moving its version forward.
+
+    Raises IntegrityError if the new IBAN already exists
+    """
+    fields = {field: data[field] for field in EDITABLE_FIELDS if field in data}
+    fields['updated_at'] = timezone.now()
+    if Account.objects.filter(**_conditions(account_id, creator, version)).update(version=F('version') + 1, **fields):
+        return UPDATED
+    return _failure(account_id, creator)
+
+
+def delete_account(account_id, creator, version=None):
+    """
+    Delete an account with one conditional DELETE, leaving a tombstone for the change feed
+    """
+    with transaction.atomic():
+        deleted, _ = Account.objects.filter(**_conditions(account_id, creator, version)).delete()
+        if deleted:
+            AccountTombstone.objects.create(account_id=account_id)
+            return DELETED
+    return _failure(account_id, creator)
+
+
+def _check(account, creator, data):
+    # Same rules as the single modification/deletion, decided on the rows read (and locked) at once
+    if account is None:
+        return NOT_FOUND
+    if account.creator_id != creator.pk:
+        return NO_PERMISSION
+    if data.get('version', account.version) != account.version:
+        return CONFLICT
+    return None
+
+
+def _update(valid, creator, batch_size):
+    """
+    Modify the accounts of the validated operations, given as (index, data) pairs, with one query reading all of
+    them and a `bulk_update`, returning the (index, result) pairs
+    """
+    accounts = Account.objects.select_for_update().in_bulk({data['id'] for _, data in valid})
+    owners = iban_owners({data['iban'] for _, data in valid if 'iban' in data})
+    now = timezone.now()
+    results = []
+    changed = {}
+    for index, data in valid:
+        account = accounts.get(data['id'])
+        failure = _check(account, creator, data)
+        if failure is not None:
+            results.append((index, {'status': failure, 'id': data['id']}))
+            continue
+        if owners.get(data.get('iban'), account.pk) != account.pk:
+            results.append((index, {'status': ERROR, 'errors': {'iban': ['iban already exists']}}))
+            continue
+
+        if 'iban' in data:
+            owners.pop(account.iban, None)
+            owners[data['iban']] = account.pk
+        for field in EDITABLE_FIELDS:
+            if field in data:
+                setattr(account, field, data[field])
+        # The same account can be modified several times in a row, each one moving the version forward
+        account.version += 1
+        account.updated_at = now
+        changed[account.pk] = account
+        results.append((index, {'status': UPDATED, 'id': account.pk, 'version': account.version}))
+
+    Account.objects.bulk_update(
+        changed.values(), EDITABLE_FIELDS + ('version', 'updated_at'), batch_size=batch_size)
+    return results
+
+
+def _delete(valid, creator, batch_size):
+    """
+    Delete the accounts of the validated operations, given as (index, data) pairs, with one query reading all of
+    them and one DELETE, returning the (index, result) pairs
+    """
+    accounts = Account.objects.select_for_update().only('id', 'creator_id', 'version').in_bulk(
+        {data['id'] for _, data in valid})
+    results = []
+    deleted = []
+    for index, data in valid:
+        failure = _check(accounts.pop(data['id'], None), creator, data)
+        if failure is None:
+            deleted.append(data['id'])
+        results.append((index, {'status': failure or DELETED, 'id': data['id']}))
+
+    for chunk in _chunks(deleted):
+        Account.objects.filter(id__in=chunk).delete()
+    tombstones = [AccountTombstone(account_id=account_id) for account_id in deleted]
+    AccountTombstone.objects.bulk_create(tombstones, batch_size=batch_size)
+    return results
+
+
+# Function running each kind of operation, for a run of consecutive operations of the same kind
+BATCH_OPERATIONS = {
+    'add': _create,
+    'update': _update,
+    'delete': _delete,
+}
+
+
+def run_batch(operations, creator, atomic=True, batch_size=None):
+    """
+    Run an ordered list of account operations (add, update and delete) inside one transaction.
+
+    Consecutive operations of the same kind are done together with set-based queries. When `atomic`, nothing is
+    done if any operation fails (the rest are skipped, the ones already done rolled back), otherwise the failed
+    ones are just reported. Returns one result per operation, in the same order, and whether something was saved
+    """
+    if batch_size is None:
+        batch_size = getattr(settings, 'ACCOUNTS_BULK_BATCH_SIZE', 1000)
+
+    validator = AccountOperationSerializer(partial=True)
+    results = [None] * len(operations)
+    valid = []
+    for index, operation in enumerate(operations):
+        try:
+            valid.append((index, validator.run_validation(operation)))
+        except serializers.ValidationError as e:
+            op = operation.get('op') if isinstance(operation, dict) else None
+            results[index] = {'index': index, 'op': op, 'status': ERROR, 'errors': e.detail}
+    failed = len(valid) < len(operations)
+
+    with transaction.atomic():
+        for op, run in groupby(valid, key=lambda item: item[1]['op']):
+            run = list(run)
+            if atomic and failed:
+                run_results = [(index, {'status': SKIPPED}) for index, _ in run]
+            else:
+                try:
+                    # Savepoint, so an IBAN created in the meantime by another request only fails this run
+                    with transaction.atomic():
+                        run_results = BATCH_OPERATIONS[op](run, creator, batch_size)
+                except IntegrityError:
+                    run_results = [(index, {'status': ERROR, 'errors': {'iban': ['iban already exists']}})
+                                   for index, _ in run]
+            for index, result in run_results:
+                results[index] = dict(result, index=index, op=op)
+                failed = failed or result['status'] not in (CREATED, UPDATED, DELETED)
+
+        if atomic and failed:
+            transaction.set_rollback(True)
+            for result in results:
+                if result['status'] in (CREATED, UPDATED, DELETED):
+                    result['status'] = ROLLED_BACK
+            return results, False
+
+    return results, any(result['status'] in (CREATED, UPDATED, DELETED) for result in results)
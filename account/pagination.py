@@ -0,0 +1,21 @@
+from django.conf import settings
+
+from rest_framework.pagination import CursorPagination
+
+
+class AccountCursorPagination(CursorPagination):
+    """
+    Keyset pagination over the account primary key.
+
+    The cursor is opaque for the clients (base64 encoded by the rest framework) and only stores the last `id` seen,
+    so every page is resolved with a single `WHERE id > cursor ORDER BY id LIMIT page_size + 1` query, no matter how
+    deep in the table the page is
+    """
+    ordering = 'id'
+    page_size_query_param = 'page_size'
+
+    def get_page_size(self, request):
+        # Reading the sizes on every call so they can be changed in settings (and overridden in tests)
+        self.page_size = getattr(settings, 'ACCOUNTS_PAGE_SIZE', 100)
+        self.max_page_size = getattr(settings, 'ACCOUNTS_MAX_PAGE_SIZE', 1000)
+        return super().get_page_size(request)
@@ -0,0 +1,169 @@
+import cProfile
+import io
+import os
+import pstats
+import random
+import re
+import time
+from datetime import datetime
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+
+from rest_framework.exceptions import AuthenticationFailed
+
+from account.authentication import CachedTokenAuthentication
+
+# Names of the written profiles, also the only ones the profiles endpoint reads
+PROFILE_ID = re.compile(r'^[\w.-]+$')
+
+
+def profiling_config():
+    config = {'ENABLED': False, 'HEADER': 'X-Profile', 'SAMPLE_RATE': 0.0, 'DIRECTORY': 'profiles', 'TOP': 40,
+              'KEEP': 200}
+    config.update(getattr(settings, 'PROFILING', {}))
+    return config
+
+
+def _is_staff(request):
+    # The API users authenticate with tokens (checked by the views, after the middlewares), the admin ones with the
+    # session
+    if getattr(request, 'user', None) is not None and request.user.is_staff:
+        return True
+    try:
+        credentials = CachedTokenAuthentication().authenticate(request)
+    except AuthenticationFailed:
+        return False
+    return credentials is not None and credentials[0].is_staff
+
+
+class _QueryLog:
+    """
+    Execute wrapper keeping every query of the profiled request with its duration
+    """
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((time.perf_counter() - start, sql))
+
+
+def prune_profiles(directory, keep):
+    """
+    Delete the oldest profiles of the directory, keeping the `keep` most recent ones
+    """
+    profile_ids = sorted({os.path.splitext(name)[0] for name in os.listdir(directory)
+                          if name.endswith(('.prof', '.txt'))})
+    for profile_id in profile_ids[:max(0, len(profile_ids) - keep)]:
+        for extension in ('.prof', '.txt'):
+            try:
+                os.remove(os.path.join(directory, profile_id + extension))
+            except FileNotFoundError:
+                # Deleted by another process pruning at the same time
+                pass
+
+
+def write_profile(directory, request, profiler, queries, duration, top, keep=None):
+    """
+    Save the profile (.prof, to open with pstats or snakeviz) and its text summary (.txt, the functions sorted by
+    cumulative time and the queries sorted by duration), returning the id of the profile.
+
+    If given, only the `keep` most recent profiles are kept in the directory
+    """
+    os.makedirs(directory, exist_ok=True)
+    match = request.resolver_match
+    name = match.view_name if match is not None else 'unmatched'
+    profile_id = '{0}-{1}-{2}'.format(datetime.now().strftime('%Y%m%d%H%M%S%f'), os.getpid(),
+                                      re.sub(r'[^\w.-]', '_', name))
+    path = os.path.join(directory, profile_id)
+    profiler.dump_stats(path + '.prof')
+
+    summary = io.StringIO()
+    summary.write('{0} {1} ({2}) in {3:.1f}ms, {4} queries in {5:.1f}ms\n\n'.format(
+        request.method, request.get_full_path(), name, duration * 1000, len(queries),
+        sum(query_duration for query_duration, _ in queries) * 1000))
+    pstats.Stats(profiler, stream=summary).sort_stats('cumulative').print_stats(top)
+    summary.write('Queries by duration:\n')
+    for query_duration, sql in sorted(queries, reverse=True)[:top]:
+        summary.write('{0:10.3f}ms  {1}\n'.format(query_duration * 1000, sql))
+    with open(path + '.txt', 'w') as f:
+        f.write(summary.getvalue())
+    if keep is not None:
+        prune_profiles(directory, keep)
+    return profile_id
+
+
+class ProfilingMiddleware:
+    """
+    Profile with cProfile the requests of the staff users sending the profiling header, and a sample of all the
+    requests, writing the results to `PROFILING['DIRECTORY']`.
+
+    Only loaded when `PROFILING['ENABLED']`, otherwise it is not in the middleware chain at all
+    """
+    def __init__(self, get_response):
+        config = profiling_config()
+        if not config['ENABLED']:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.header = 'HTTP_' + config['HEADER'].upper().replace('-', '_')
+        self.sample_rate = config['SAMPLE_RATE']
+        self.directory = config['DIRECTORY']
+        self.top = config['TOP']
+        self.keep = config['KEEP']
+
+    def __call__(self, request):
+        if self.header in request.META:
+            profiled = _is_staff(request)
+        else:
+            profiled = random.random() < self.sample_rate
+        if not profiled:
+            return self.get_response(request)
+
+        profiler = cProfile.Profile()
+        queries = _QueryLog()
+        start = time.perf_counter()
+        with connection.execute_wrapper(queries):
+            profiler.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.disable()
+        duration = time.perf_counter() - start
+
+        # Written in the request, which is why only the staff requests and a sample of all of them are profiled
+        response['X-Profile-Id'] = write_profile(self.directory, request, profiler, queries.queries, duration,
+                                                 self.top, self.keep)
+        return response
+
+
+def list_profiles(directory=None, limit=50):
+    """
+    Return the ids of the most recent profiles, newest first
+    """
+    if directory is None:
+        directory = profiling_config()['DIRECTORY']
+    try:
+        names = [name[:-4] for name in os.listdir(directory) if name.endswith('.txt')]
+    except FileNotFoundError:
+        return []
+    return sorted(names, reverse=True)[:limit]
+
+
+def read_profile(profile_id, directory=None):
+    """
+    Return the text summary of the given profile, or None if it does not exist
+    """
+    if directory is None:
+        directory = profiling_config()['DIRECTORY']
+    if not PROFILE_ID.match(profile_id):
+        return None
+    try:
+        with open(os.path.join(directory, profile_id + '.txt')) as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
@@ -0,0 +1,24 @@
+import json
+
+from rest_framework.renderers import BaseRenderer
+
+
+class ColumnarJSONRenderer(BaseRenderer):
+    """
+    Renderer of the account listings as one array per field (`{"id": [1, 2], "iban": ["ES76...", "GB82..."]}`, inside
+    `results` for the paginated ones), chosen with `Accept: application/vnd.accounts.columns+json` or
+    `?format=columns`.
+
+    The views build the columns themselves (see `account_list_data`), so the names of the fields are written once
+    instead of once per account, and the encoder only goes through flat lists
+    """
+    media_type = 'application/vnd.accounts.columns+json'
+    format = 'columns'
+    # JSON is binary, like for `JSONRenderer`
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        # Only built-in types (no need for the rest framework encoder), and never circular
+        return json.dumps(data, ensure_ascii=False, separators=(',', ':'), check_circular=False).encode('utf-8')
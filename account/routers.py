@@ -0,0 +1,131 @@
+import hashlib
+import itertools
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+
+from rest_framework.authentication import get_authorization_header
+from rest_framework.permissions import SAFE_METHODS
+
+# Whether the reads of the current thread can go to the replicas, only inside the GET views
+_state = threading.local()
+
+
+def replicas_config():
+    config = {'REPLICAS': {}, 'STICKY_SECONDS': 5, 'PRIMARY_VIEWS': (), 'APPS': ('account',), 'CACHE': 'shared'}
+    config.update(getattr(settings, 'DATABASE_REPLICAS', {}))
+    return config
+
+
+@contextmanager
+def use_replicas(enabled=True):
+    """
+    Allow (or forbid, with `use_primary()`) the reads of the block to go to the replicas
+    """
+    previous = getattr(_state, 'replicas', False)
+    _state.replicas = enabled
+    try:
+        yield
+    finally:
+        _state.replicas = previous
+
+
+def reading_replicas():
+    """
+    Whether the reads of the current thread go to the replicas
+    """
+    return getattr(_state, 'replicas', False) and bool(replicas_config()['REPLICAS'])
+
+
+def use_primary():
+    """
+    Send the reads of the block to the primary, like the ones filling a cache which must never be stale
+    """
+    return use_replicas(False)
+
+
+class ReplicaRouter:
+    """
+    Send the reads of the models of `DATABASE_REPLICAS['APPS']` to the replicas (in turns, as many as their weight)
+    when they are allowed (see `ReplicaRoutingMiddleware`), everything else to the primary (`default`)
+    """
+    def __init__(self):
+        self._turns = {}
+
+    def _next_replica(self, replicas):
+        # One cycle per configuration, so it follows the changes of the settings (like in the tests)
+        key = tuple(sorted(replicas.items()))
+        turns = self._turns.get(key)
+        if turns is None:
+            turns = self._turns[key] = itertools.cycle([alias for alias, weight in key for _ in range(weight)])
+        return next(turns)
+
+    def db_for_read(self, model, **hints):
+        if not getattr(_state, 'replicas', False):
+            return None
+        config = replicas_config()
+        if not config['REPLICAS'] or model._meta.app_label not in config['APPS']:
+            return None
+        return self._next_replica(config['REPLICAS'])
+
+    def db_for_write(self, model, **hints):
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replicas have the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replicas get the tables (and the data) from the primary
+        if db in replicas_config()['REPLICAS']:
+            return False
+        return None
+
+
+def _sticky_key(request):
+    auth = get_authorization_header(request).split()
+    if len(auth) != 2 or auth[0].lower() != b'token':
+        return None
+    return 'replica:sticky:{0}'.format(hashlib.sha1(auth[1]).hexdigest())
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Allow the reads of the GET views to go to the replicas, except the views in `DATABASE_REPLICAS['PRIMARY_VIEWS']`
+    and the requests of the tokens which wrote something in the last `STICKY_SECONDS` (so the users always read
+    their own writes, whatever the replication lag). The writes are remembered in `DATABASE_REPLICAS['CACHE']`,
+    which must be shared by all the processes: the next request of the token can be served by any of them.
+
+    Streamed responses read after the middleware returns, so they always use the primary
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        config = replicas_config()
+        if not config['REPLICAS']:
+            return self.get_response(request)
+
+        # Imported here, account.cache reads the state of this module
+        from account.cache import shared_cache
+
+        key = _sticky_key(request)
+        cache = shared_cache(config['CACHE'])
+        if request.method not in SAFE_METHODS:
+            request.replicas_allowed = False
+            response = self.get_response(request)
+            if key is not None:
+                # The stickiness is shared by all the processes through the cache
+                cache.set(key, True, config['STICKY_SECONDS'])
+            return response
+
+        request.replicas_allowed = key is None or not cache.get(key)
+        try:
+            return self.get_response(request)
+        finally:
+            _state.replicas = False
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if getattr(request, 'replicas_allowed', False):
+            _state.replicas = request.resolver_match.view_name not in replicas_config()['PRIMARY_VIEWS']
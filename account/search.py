@@ -0,0 +1,29 @@
+from account.models import Account
+
+
+def prefix_range(prefix):
+    """
+    Return the (lowest, highest) bounds of the strings starting with the prefix, highest not included, so a prefix
+    can be searched as a range on a plain index
+    """
+    return prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def search_accounts(first_name=None, last_name=None, iban=None):
+    """
+    Filter the accounts by the beginning of their names (not case sensitive) and/or their IBAN (like the country).
+
+    Every filter is resolved with an index scan (see migration 0005_account_search_indexes)
+    """
+    queryset = Account.objects.all()
+    if first_name:
+        queryset = queryset.filter(first_name__istartswith=first_name)
+    if last_name:
+        queryset = queryset.filter(last_name__istartswith=last_name)
+    # IBANs are stored normalized, only searched if something is left (blank prefixes match every account)
+    iban = (iban or '').replace(' ', '').upper()
+    if iban:
+        # A range uses the unique index of the IBAN on every database
+        lowest, highest = prefix_range(iban)
+        queryset = queryset.filter(iban__gte=lowest, iban__lt=highest)
+    return queryset
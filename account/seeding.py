@@ -0,0 +1,125 @@
+import random
+import string
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from account.models import Account
+from account.operations import insert_batch_size
+from account.utils import BBAN_FORMATS, bban_parts, build_iban
+
+FIRST_NAMES = (
+    'Agustin', 'Eva', 'Juan', 'Maria', 'Pedro', 'Lucia', 'Carlos', 'Ana', 'Sofia', 'Diego', 'Javier', 'Laura',
+    'Pablo', 'Elena', 'Miguel', 'Carmen', 'Hugo', 'Marta', 'Daniel', 'Paula', 'Jan', 'Emma', 'Lukas', 'Mia', 'Noah',
+    'Julia', 'Louis', 'Chloe', 'Oliver', 'Amelia', 'Jack', 'Isla', 'Luca', 'Giulia', 'Tiago', 'Beatriz', 'Lars',
+    'Anna', 'Thomas', 'Charlotte',
+)
+
+LAST_NAMES = (
+    'Martinez', 'Perez', 'Lopez', 'Garcia', 'Fernandez', 'Gonzalez', 'Rodriguez', 'Sanchez', 'Romero', 'Navarro',
+    'Muller', 'Schmidt', 'Schneider', 'Fischer', 'Weber', 'Martin', 'Bernard', 'Dubois', 'Moreau', 'Laurent',
+    'Smith', 'Jones', 'Taylor', 'Brown', 'Williams', 'De Jong', 'Jansen', 'De Vries', 'Bakker', 'Visser', 'Rossi',
+    'Russo', 'Ferrari', 'Esposito', 'Bianchi', 'Silva', 'Santos', 'Ferreira', 'Peeters', 'Janssens',
+)
+
+# Countries of the generated IBANs, with numeric and alphanumeric BBANs of different lengths
+SEED_COUNTRIES = ('ES', 'DE', 'FR', 'GB', 'NL', 'IT', 'PT', 'BE', 'AT', 'IE')
+
+CHARACTERS = {'n': string.digits, 'a': string.ascii_uppercase, 'c': string.digits + string.ascii_uppercase}
+
+# Parts of the BBAN of every seeded country, parsed once
+_BBAN_PARTS = {country: bban_parts(BBAN_FORMATS[country]) for country in SEED_COUNTRIES}
+
+# Last digits of the generated BBANs which encode the index of the account (all the seeded countries have at least
+# as many), so the IBANs are unique without remembering them
+INDEX_DIGITS = 10
+
+# Spreading the consecutive indexes over all the values of those digits: coprime with 10, so multiplying by it modulo
+# 10 ** INDEX_DIGITS never gives the same digits for two indexes
+INDEX_MULTIPLIER = 2654435761
+
+
+def random_iban(rng, country):
+    """
+    Return a valid IBAN of the country with a random BBAN, using the given random generator
+    """
+    parts = []
+    for count, kind in _BBAN_PARTS[country]:
+        if kind == 'n':
+            parts.append('{0:0{1}d}'.format(rng.randrange(10 ** count), count))
+        else:
+            parts.append(''.join(rng.choices(CHARACTERS[kind], k=count)))
+    return build_iban(country, ''.join(parts))
+
+
+def indexed_iban(rng, country, index):
+    """
+    Return a valid IBAN of the country whose last INDEX_DIGITS digits are the given index, the rest of the BBAN random
+    """
+    characters = []
+    for count, kind in _BBAN_PARTS[country]:
+        characters.extend((kind, character) for character in rng.choices(CHARACTERS[kind], k=count))
+    digits = list('{0:0{1}d}'.format(index, INDEX_DIGITS))
+    bban = []
+    for kind, character in reversed(characters):
+        bban.append(digits.pop() if kind == 'n' and digits else character)
+    return build_iban(country, ''.join(reversed(bban)))
+
+
+def generate_accounts(count, creators, seed=0):
+    """
+    Yield `count` unsaved accounts with realistic names and valid IBANs, spread randomly among the `creators`.
+
+    The same seed always generates the same accounts, and the IBANs are never repeated: the index of every account is
+    encoded in its IBAN, so nothing is kept in memory while generating them
+    """
+    if count > 10 ** INDEX_DIGITS:
+        raise ValueError('At most {0} accounts can be generated'.format(10 ** INDEX_DIGITS))
+    rng = random.Random(seed)
+    # Choosing the creators with another generator, so the same seed generates the same data whatever their number
+    creators_rng = random.Random('{0}:creators'.format(seed))
+    offset = rng.randrange(10 ** INDEX_DIGITS)
+    for index in range(count):
+        iban = indexed_iban(rng, rng.choice(SEED_COUNTRIES), (index * INDEX_MULTIPLIER + offset) % 10 ** INDEX_DIGITS)
+        yield Account(first_name=rng.choice(FIRST_NAMES), last_name=rng.choice(LAST_NAMES), iban=iban,
+                      creator=creators[creators_rng.randrange(len(creators))])
+
+
+def seed_creators(count):
+    """
+    Return `count` users to be the creators of the seeded accounts, creating the ones not created before
+    """
+    users = []
+    for i in range(count):
+        user, created = User.objects.get_or_create(username='seed-{0}'.format(i))
+        if created:
+            user.set_unusable_password()
+            user.save(update_fields=['password'])
+        users.append(user)
+    return users
+
+
+def seed_accounts(count, creators, seed=0, chunk_size=None, batch_size=None):
+    """
+    Insert `count` generated accounts with `bulk_create`, committing every `chunk_size` of them.
+
+    IBANs already stored (like the ones seeded before with the same seed) are skipped. Yields the cumulative number of
+    generated accounts after every chunk
+    """
+    if chunk_size is None:
+        chunk_size = getattr(settings, 'ACCOUNTS_IMPORT_CHUNK_SIZE', 10000)
+    if batch_size is None:
+        batch_size = getattr(settings, 'ACCOUNTS_BULK_BATCH_SIZE', 1000)
+
+    generated = 0
+    chunk = []
+    for account in generate_accounts(count, creators, seed):
+        chunk.append(account)
+        if len(chunk) >= chunk_size or generated + len(chunk) == count:
+            with transaction.atomic():
+                Account.objects.bulk_create(chunk, batch_size=insert_batch_size(chunk, batch_size),
+                                            ignore_conflicts=True)
+            generated += len(chunk)
+            chunk = []
+            yield generated
@@ -1,5 +1,3 @@
-from django.contrib.auth.models import User
-
 from rest_framework import serializers
 
 from account.models import Account
@@ -16,28 +14,69 @@ class SocialSerializer(serializers.Serializer):
     )
 
 
-class AccountSerializer(serializers.Serializer):
+class AccountDataSerializer(serializers.Serializer):
     """
-    Serializer which manage and validate all the interactions with Account model
+    Serializer which validates the account data sent by the users (the creator is always who did the request)
     """
-    # Needed when updating an already created instance
-    id = serializers.IntegerField(required=False)
-
     # Using the most common standard length, 35 for each one and a total of 70
     first_name = serializers.CharField(max_length=35)
     last_name = serializers.CharField(max_length=35)
 
     # Getting the max length from: https://en.wikipedia.org/wiki/International_Bank_Account_Number#Structure
     # 2 Country code + 2 Check digits + 30 BBAN (Basic Bank Account Number)
-    iban = serializers.CharField(validators=[verify_iban, ])
+    iban = serializers.CharField()
+
+    def validate_iban(self, value):
+        # Storing the IBANs normalized, so the same one can not be saved twice written in a different way
+        return verify_iban(value)
+
+
+class AccountOperationSerializer(AccountDataSerializer):
+    """
+    Serializer which validates one operation of a batch: an account to add, modify or delete.
+
+    It must be used with `partial=True`, the account fields are only required when adding one
+    """
+    OPERATIONS = ('add', 'update', 'delete')
+
+    op = serializers.ChoiceField(choices=OPERATIONS)
+
+    # Account to modify/delete, and the version the user read like in the single operations
+    id = serializers.IntegerField(required=False)
+    version = serializers.IntegerField(required=False, min_value=1)
+
+    def validate(self, attrs):
+        if 'op' not in attrs:
+            required = ['op']
+        elif attrs['op'] == 'add':
+            required = [field for field in ('first_name', 'last_name', 'iban') if field not in attrs]
+        else:
+            required = [] if 'id' in attrs else ['id']
+        if required:
+            raise serializers.ValidationError(
+                {field: [self.fields[field].error_messages['required']] for field in required})
+        return attrs
+
+
+class AccountSerializer(AccountDataSerializer):
+    """
+    Serializer which manage and validate all the interactions with Account model
+    """
+    # Needed when updating an already created instance
+    id = serializers.IntegerField(required=False)
+
+    # Version the user read, to not overwrite modifications done in the meantime by someone else
+    version = serializers.IntegerField(required=False, min_value=1)
 
-    # Validating against User table
-    creator = serializers.PrimaryKeyRelatedField(queryset=User.objects)
+    # Always who did the request, taken from the request in the context (already loaded by the authentication)
+    creator = serializers.HiddenField(default=serializers.CurrentUserDefault())
 
     def create(self, validated_data):
         """
         Create and return a new `Account` instance, given the validated data.
         """
+        # The id and version are only used to find the instance to update, new accounts get them from the database
+        validated_data = {key: value for key, value in validated_data.items() if key not in ('id', 'version')}
         return Account.objects.create(**validated_data)
 
     def update(self, instance, validated_data):
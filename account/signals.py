@@ -0,0 +1,41 @@
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import Signal, receiver
+
+from rest_framework.authtoken.models import Token
+
+from account.authentication import token_cache
+from account.cache import bump_accounts_version
+from account.models import Account, AccountTombstone
+
+# Sent once the accounts were created, modified or deleted (after the changes are committed)
+accounts_changed = Signal()
+accounts_changed.connect(bump_accounts_version, dispatch_uid='bump_accounts_version')
+
+
+@receiver([post_save, post_delete], sender=Token)
+def invalidate_token(sender, instance, **kwargs):
+    """
+    Stop accepting a cached token as soon as it is deleted (logout) or replaced
+    """
+    token_cache.invalidate(instance.key)
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_tokens(sender, instance, **kwargs):
+    """
+    Reload the user of the cached tokens when it changes (e.g. when it is deactivated)
+    """
+    token_cache.invalidate_user(instance.pk)
+
+
+@receiver(pre_delete, sender=User)
+def tombstone_user_accounts(sender, instance, **kwargs):
+    """
+    Leave a tombstone for the accounts deleted along with their creator, for the change feed
+    """
+    account_ids = list(Account.objects.filter(creator_id=instance.pk).values_list('id', flat=True))
+    if account_ids:
+        AccountTombstone.objects.bulk_create([AccountTombstone(account_id=account_id) for account_id in account_ids])
+        transaction.on_commit(lambda: accounts_changed.send(sender=Account))
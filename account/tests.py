@@ -1,9 +1,48 @@
+import csv
+import gzip
+import json
+import multiprocessing
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+from urllib.parse import parse_qs, urlparse
+
 from django.contrib.auth.models import User
+from django.core.cache import cache, caches
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.conf import settings
+from django.db import connection, connections
+from django.db.models import F
+from django.test import SimpleTestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
+from requests.exceptions import HTTPError
 from rest_framework import status
+from rest_framework.exceptions import ValidationError
 from rest_framework.authtoken.models import Token
 from rest_framework.test import APITestCase, APIClient
+from account.authentication import (
+    ExchangeCache, TokenCache, exchange_cache, expired_tokens, purge_expired_tokens, token_cache,
+)
+from account.benchmarks import BUDGETS_FILE, check_budgets, load
+from account.benchmarks.oauth2 import StubOAuth2, stub_oauth2
+from account.db.pool import ConnectionPool, PoolTimeout, pool_stats
+from account.imports import import_accounts
+from account import metrics
+from account.metrics import BUCKETS, COUNT, QUERIES, RESPONSE_BYTES, render_metrics, snapshot
 from account.models import Account
+from account.operations import insert_batch_size
+from account.search import search_accounts
+from account.seeding import generate_accounts
+from account.signals import accounts_changed
+from account.utils import build_iban, verify_iban, verify_ibans
 
 
 class AccountTests(APITestCase):
@@ -11,6 +50,8 @@ class AccountTests(APITestCase):
         """
         Ensure we can create an administrator user and we can authenticate with him
         """
+        cache.clear()
+        caches[settings.ACCOUNTS_CACHE].clear()
         self.client = APIClient()
         self.user = User.objects.create_superuser('admin', 'admin@admin.com', 'admin123')
         self.token = 'Token ' + Token.objects.create(user=self.user).key
@@ -32,24 +73,29 @@ class AccountTests(APITestCase):
             self.assertEqual(Account.objects.get().iban, 'ES7620770024003102575766')
 
 
-    def get_all_accounts(self):
+    def test_get_all_accounts(self):
         """
         Ensure we can retrieve all accounts data
         """
+        Account.objects.create(first_name='Agustin', last_name='Martinez', iban='ES7620770024003102575766',
+                               creator=self.user)
         self.client.force_login(user=self.user)
         url = reverse('accounts:accounts')
         response = self.client.get(url, {}, format='json', HTTP_AUTHORIZATION=self.token)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 1)
         self.assertEqual(Account.objects.count(), 1)
 
-    def update_account(self):
+    def test_update_account(self):
         """
         Ensure we can update account data
         """
+        account = Account.objects.create(first_name='Agustin', last_name='Martinez', iban='ES7620770024003102575766',
+                                         creator=self.user)
         self.client.force_login(user=self.user)
         url = reverse('accounts:accounts_modify')
         data = {
-            'id': Account.objects.get(iban='ES7620770024003102575766'),
+            'id': account.id,
             'first_name': 'Eva',
             'last_name': 'Perez',
             'iban': 'ES7620770024003102575766'
@@ -59,14 +105,16 @@ class AccountTests(APITestCase):
         self.assertEqual(Account.objects.count(), 1)
         self.assertEqual(Account.objects.get().first_name, 'Eva')
 
-    def delete_account(self):
+    def test_delete_account(self):
         """
         Ensure we can delete the account we created
         """
+        account = Account.objects.create(first_name='Agustin', last_name='Martinez', iban='ES7620770024003102575766',
+                                         creator=self.user)
         self.client.force_login(user=self.user)
         url = reverse('accounts:accounts_delete')
         data = {
-            'id': Account.objects.get(iban='ES7620770024003102575766'),
+            'id': account.id,
             'first_name': 'Eva',
             'last_name': 'Perez',
             'iban': 'ES7620770024003102575766'
@@ -74,3 +122,1027 @@ class AccountTests(APITestCase):
         response = self.client.delete(url, data, format='json', HTTP_AUTHORIZATION=self.token)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(Account.objects.count(), 0)
+
+    def test_metrics(self):
+        """
+        Ensure the requests are recorded per view and only the staff users can see the metrics
+        """
+        Account.objects.create(first_name='Agustin', last_name='Martinez', iban='ES7620770024003102575766',
+                               creator=self.user)
+        before = snapshot().get('accounts:accounts', [0] * 5)
+        for _ in range(3):
+            self.client.get(reverse('accounts:accounts'), HTTP_AUTHORIZATION=self.token)
+        after = snapshot()['accounts:accounts']
+        self.assertEqual(after[COUNT] - before[COUNT], 3)
+        # The first request reads the token and the accounts, the next ones are served from the caches
+        self.assertEqual(after[QUERIES] - before[QUERIES], 4)
+        self.assertGreater(after[RESPONSE_BYTES], before[RESPONSE_BYTES])
+        self.assertEqual(sum(after[BUCKETS:]), after[COUNT])
+        # The queries are counted by the same wrapper for all the requests of the thread
+        self.assertEqual(connection.execute_wrappers.count(metrics._store()), 1)
+
+        response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION=self.token)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        body = response.content.decode()
+        self.assertIn('http_requests_total{{view="accounts:accounts"}} {0}'.format(after[COUNT]), body)
+        self.assertIn('http_request_duration_seconds_bucket{{view="accounts:accounts",le="+Inf"}} {0}'.format(
+            after[COUNT]), body)
+        self.assertIn('# TYPE db_queries_total counter', body)
+
+        other = User.objects.create_user('other', 'other@other.com', 'other123')
+        other_token = 'Token ' + Token.objects.create(user=other).key
+        response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION=other_token)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        # The stores of the finished threads are dropped as soon as another thread starts, keeping their counters
+        for _ in range(3):
+            thread = threading.Thread(target=metrics._store)
+            thread.start()
+            thread.join()
+        # Only the last one, dropped when the next one starts
+        self.assertLessEqual(len([store for store in metrics._stores if not store.thread.is_alive()]), 1)
+        self.assertEqual(snapshot()['accounts:accounts'][COUNT], after[COUNT])
+
+    def test_profiling(self):
+        """
+        Ensure the staff users can profile their requests with the header, and read the profiles summaries
+        """
+        Account.objects.create(first_name='Agustin', last_name='Martinez', iban='ES7620770024003102575766',
+                               creator=self.user)
+        other = 'Token ' + Token.objects.create(user=User.objects.create_user('other', 'other@other.com')).key
+        url = reverse('accounts:accounts')
+        response = APIClient().get(url, HTTP_AUTHORIZATION=self.token, HTTP_X_PROFILE='1')
+        self.assertNotIn('X-Profile-Id', response)
+
+        with tempfile.TemporaryDirectory() as directory, \
+                self.settings(PROFILING={'ENABLED': True, 'DIRECTORY': directory}):
+            client = APIClient()
+            response = client.get(url, HTTP_AUTHORIZATION=other, HTTP_X_PROFILE='1')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotIn('X-Profile-Id', response)
+            response = client.get(url, HTTP_AUTHORIZATION=self.token)
+            self.assertNotIn('X-Profile-Id', response)
+
+            response = client.get(url, HTTP_AUTHORIZATION=self.token, HTTP_X_PROFILE='1')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            profile_id = response['X-Profile-Id']
+            self.assertTrue(os.path.exists(os.path.join(directory, profile_id + '.prof')))
+
+            response = client.get(reverse('profiles'), HTTP_AUTHORIZATION=self.token)
+            self.assertEqual(response.data['profiles'], [profile_id])
+            response = client.get(reverse('profile_detail', args=[profile_id]), HTTP_AUTHORIZATION=self.token)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            summary = response.content.decode()
+            self.assertIn('GET /accounts/get/all (accounts:accounts)', summary)
+            self.assertIn('cumulative time', summary)
+            self.assertIn('Queries by duration:', summary)
+
+            response = client.get(reverse('profile_detail', args=[profile_id]), HTTP_AUTHORIZATION=other)
+            self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+            response = client.get(reverse('profile_detail', args=['..']), HTTP_AUTHORIZATION=self.token)
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        # Only the most recent profiles are kept
+        with tempfile.TemporaryDirectory() as directory, \
+                self.settings(PROFILING={'ENABLED': True, 'DIRECTORY': directory, 'KEEP': 2}):
+            client = APIClient()
+            profile_ids = [client.get(url, HTTP_AUTHORIZATION=self.token, HTTP_X_PROFILE='1')['X-Profile-Id']
+                           for _ in range(3)]
+            self.assertEqual(sorted(os.listdir(directory)),
+                             sorted(profile_id + extension for profile_id in profile_ids[1:]
+                                    for extension in ('.prof', '.txt')))
+
+    def test_get_accounts_page(self):
+        """
+        Ensure we can walk through all the accounts page by page with a constant number of queries
+        """
+        other = User.objects.create_user('other', 'other@other.com', 'other123')
+        Account.objects.bulk_create([
+            Account(first_name='Name{0}'.format(i), last_name='Surname', iban='ES76{0:020d}'.format(i),
+                    creator=self.user if i % 2 else other)
+            for i in range(25)
+        ])
+        self.client.force_authenticate(user=self.user)
+        url = reverse('accounts:accounts_page')
+        seen = []
+        # The first request also computes the accounts change marker (for the ETag), cached for the next pages
+        queries = 2
+        with self.settings(ACCOUNTS_PAGE_SIZE=10):
+            while url:
+                with self.assertNumQueries(queries):
+                    response = self.client.get(url, format='json')
+                queries = 1
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                for row in response.data['results']:
+                    self.assertEqual(row['is_editable'], Account.objects.get(id=row['id']).creator_id == self.user.pk)
+                seen.extend(row['id'] for row in response.data['results'])
+                url = response.data['next']
+        self.assertEqual(seen, list(Account.objects.order_by('id').values_list('id', flat=True)))
+
+    def test_get_accounts_page_size_cap(self):
+        """
+        Ensure the page size requested by the client is capped
+        """
+        Account.objects.bulk_create([
+            Account(first_name='Name', last_name='Surname', iban='ES76{0:020d}'.format(i), creator=self.user)
+            for i in range(5)
+        ])
+        self.client.force_login(user=self.user)
+        url = reverse('accounts:accounts_page')
+        with self.settings(ACCOUNTS_MAX_PAGE_SIZE=3):
+            response = self.client.get(url, {'page_size': 100}, format='json', HTTP_AUTHORIZATION=self.token)
+        self.assertEqual(len(response.data['results']), 3)
+        self.assertIsNotNone(response.data['next'])
+        self.assertIsNone(response.data['previous'])
+
+    def test_export_accounts(self):
+        """
+        Ensure we can stream all the accounts as NDJSON and CSV
+        """
+        Account.objects.bulk_create([
+            Account(first_name='Name{0}'.format(i), last_name='Surname', iban='ES76{0:020d}'.format(i), creator=self.user)
+            for i in range(5)
+        ])
+        self.client.force_login(user=self.user)
+        url = reverse('accounts:accounts_export')
+
+        response = self.client.get(url, HTTP_AUTHORIZATION=self.token)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual([json.loads(line)['iban'] for line in lines],
+                         list(Account.objects.order_by('id').values_list('iban', flat=True)))
+
+        response = self.client.get(url, {'output': 'csv'}, HTTP_AUTHORIZATION=self.token)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        rows = list(csv.reader(b''.join(response.streaming_content).decode().splitlines()))
+        self.assertEqual(rows[0], ['id', 'first_name', 'last_name', 'iban', 'creator_id'])
+        self.assertEqual(len(rows), 6)
+
+        response = self.client.get(url, {'output': 'xml'}, HTTP_AUTHORIZATION=self.token)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        output = StringIO()
+        call_command('export_accounts', '--chunk-size', '2', stdout=output)
+        self.assertEqual(output.getvalue().splitlines(), lines)
+
+    def test_import_accounts(self):
+        """
+        Ensure we can import a CSV file in chunks, writing the rows not imported to the rejects file
+        """
+        Account.objects.create(first_name='Agustin', last_name='Martinez', iban='ES7620770024003102575766',
+                               creator=self.user)
+        with tempfile.TemporaryDirectory() as directory:
+            path = directory + '/accounts.csv'
+            with open(path, 'w', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(['id', 'first_name', 'last_name', 'iban'])
+                writer.writerow([1, 'Eva', 'Perez', 'gb82 west 1234 5698 7654 32'])
+                writer.writerow([2, 'Agustin', 'Martinez', 'ES7620770024003102575766'])
+                writer.writerow([3, 'Juan', 'Lopez', 'ES0000000000000000000000'])
+                writer.writerow([4, '', 'Lopez', 'DE89370400440532013000'])
+                writer.writerow([5, 'Juan', 'Lopez', 'DE89370400440532013000'])
+                writer.writerow([6, 'Juan', 'Lopez', 'DE89370400440532013000'])
+                for i in range(10):
+                    writer.writerow([7 + i, 'Name{0}'.format(i), 'Surname', build_iban('NL', 'ABNA{0:010d}'.format(i))])
+
+            for workers in ('0', '2'):
+                output = StringIO()
+                call_command('import_accounts', path, '--creator', 'admin', '--chunk-size', '4', '--workers', workers,
+                             stdout=output, stderr=StringIO())
+                self.assertIn('rejected (written to {0}.rejects.csv)'.format(path), output.getvalue())
+                with open(path + '.rejects.csv', newline='') as f:
+                    rejects = list(csv.DictReader(f))
+                if workers == '0':
+                    self.assertIn('16 rows read, 12 imported, 4 rejected', output.getvalue())
+                    self.assertEqual([(row['line'], row['error']) for row in rejects], [
+                        ('3', 'iban already exists'), ('4', 'IBAN has not the correct format'),
+                        ('5', 'first_name is required'), ('7', 'iban already exists'),
+                    ])
+                else:
+                    # Everything was already imported the first time
+                    self.assertIn('16 rows read, 0 imported, 16 rejected', output.getvalue())
+
+        self.assertEqual(Account.objects.count(), 13)
+        self.assertEqual(Account.objects.get(first_name='Eva').iban, 'GB82WEST12345698765432')
+
+        # An IBAN created by another request between the check and the insert is rejected, not counted as imported
+        other = User.objects.create_user('other', 'other@other.com', 'other123')
+        rejects = StringIO()
+        with mock.patch('account.imports.existing_ibans', return_value=set()):
+            counts = list(import_accounts(['first_name,last_name,iban', 'Eva,Perez,GB82WEST12345698765432'], other,
+                                          csv.writer(rejects)))
+        self.assertEqual(counts, [(1, 0, 1)])
+        self.assertIn('iban already exists', rejects.getvalue())
+
+    def test_seed_accounts(self):
+        """
+        Ensure we can fill the database with generated accounts, always the same ones for a given seed
+        """
+        users = [self.user, User(pk=0)]
+        accounts = [(account.first_name, account.last_name, account.iban) for account in generate_accounts(50, users)]
+        self.assertEqual(accounts, [(account.first_name, account.last_name, account.iban)
+                                    for account in generate_accounts(50, users)])
+        self.assertNotEqual(accounts, [(account.first_name, account.last_name, account.iban)
+                                       for account in generate_accounts(50, users, seed=1)])
+        self.assertTrue(all(result.error is None for result in verify_ibans(iban for _, _, iban in accounts)))
+
+        output = StringIO()
+        call_command('seed_accounts', '--count', '50', '--creators', '3', '--chunk-size', '20', stdout=output,
+                     stderr=StringIO())
+        self.assertIn('50 accounts generated, 50 created', output.getvalue())
+        self.assertEqual(sorted(Account.objects.values_list('iban', flat=True)), sorted(iban for _, _, iban in accounts))
+        self.assertEqual(User.objects.filter(username__startswith='seed-').count(), 3)
+
+        call_command('seed_accounts', '--count', '60', '--creators', '3', stdout=output, stderr=StringIO())
+        self.assertIn('60 accounts generated, 10 created (50 already existed)', output.getvalue())
+
+    def test_get_all_accounts_query_count(self):
+        """
+        Ensure listing all the accounts costs the same number of queries whatever the number of rows (no N+1)
+        """
+        other = User.objects.create_user('other', 'other@other.com', 'other123')
+        self.client.force_authenticate(user=self.user)
+        url = reverse('accounts:accounts')
+        created = 0
+        for total in (1, 100, 10000):
+            Account.objects.bulk_create([
+                Account(first_name='Name', last_name='Surname', iban='ES76{0:020d}'.format(i),
+                        creator=self.user if i % 2 else other)
+                for i in range(created, total)
+            ], batch_size=500)
+            accounts_changed.send(sender=Account)
+            created = total
+            with self.subTest(rows=total):
+                # Change marker (ETag) + shared rows + ids created by the user, cached until the accounts change again
+                with self.assertNumQueries(3):
+                    response = self.client.get(url, format='json')
+                self.assertEqual(len(response.data), total)
+                self.assertEqual(sum(row['is_editable'] for row in response.data), total // 2)
+
+    def test_create_accounts_bulk(self):
+        """
+        Ensure we can create several accounts at once, getting the result of each one of them
+        """
+        Account.objects.create(first_name='Agustin', last_name='Martinez', iban='ES7620770024003102575766',
+                               creator=self.user)
+        self.client.force_login(user=self.user)
+        url = reverse('accounts:accounts_add_bulk')
+        data = [
+            {'first_name': 'Eva', 'last_name': 'Perez', 'iban': 'GB82WEST12345698765432'},
+            {'first_name': 'Agustin', 'last_name': 'Martinez', 'iban': 'ES7620770024003102575766'},
+            {'first_name': 'Eva', 'last_name': 'Perez', 'iban': 'ES0000000000000000000000'},
+            {'first_name': 'Juan', 'last_name': 'Lopez', 'iban': 'DE89370400440532013000'},
+            {'first_name': 'Juan', 'last_name': 'Lopez', 'iban': 'DE89370400440532013000'},
+        ]
+        with self.settings(ACCOUNTS_BULK_BATCH_SIZE=1):
+            response = self.client.post(url, data, format='json', HTTP_AUTHORIZATION=self.token)
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual([result['status'] for result in response.data['results']],
+                         ['created', 'error', 'error', 'created', 'error'])
+        self.assertEqual(Account.objects.filter(creator=self.user).count(), 3)
+
+        response = self.client.post(url, {'first_name': 'Eva'}, format='json', HTTP_AUTHORIZATION=self.token)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        # Requests with too many accounts are rejected without creating any of them
+        with self.settings(ACCOUNTS_BULK_MAX_ACCOUNTS=1):
+            response = self.client.post(url, data[3:], format='json', HTTP_AUTHORIZATION=self.token)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Account.objects.filter(creator=self.user).count(), 3)
+
+    def test_create_account_single_statement(self):
+        """
+        Ensure creating an account costs exactly one statement and duplicated IBANs are still rejected
+        """
+        self.client.force_authenticate(user=self.user)
+        url = reverse('accounts:accounts_add')
+        data = {
+            'first_name': 'Agustin',
+            'last_name': 'Martinez',
+            'iban': 'ES7620770024003102575766'
+        }
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        statements = [query['sql'] for query in queries.captured_queries if 'SAVEPOINT' not in query['sql']]
+        self.assertEqual(len(statements), 1)
+        self.assertTrue(statements[0].startswith('INSERT'))
+        self.assertEqual(Account.objects.get().creator, self.user)
+
+        response = self.client.post(url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['errors']['non_field_error'], 'iban already exists')
+        self.assertEqual(Account.objects.count(), 1)
+
+    def test_update_delete_account_conditional(self):
+        """
+        Ensure modifications and deletions are done with one statement, telling apart every kind of failure
+        """
+        other = User.objects.create_user('other', 'other@other.com', 'other123')
+        account = Account.objects.create(first_name='Agustin', last_name='Martinez', iban='ES7620770024003102575766',
+                                         creator=self.user)
+        foreign = Account.objects.create(first_name='Eva', last_name='Perez', iban='GB82WEST12345698765432',
+                                         creator=other)
+        self.client.force_authenticate(user=self.user)
+        update_url = reverse('accounts:accounts_modify')
+        delete_url = reverse('accounts:accounts_delete')
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.put(update_url, {'id': account.id, 'version': 1, 'first_name': 'Juan'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['version'], 2)
+        statements = [query['sql'] for query in queries.captured_queries if 'SAVEPOINT' not in query['sql']]
+        self.assertEqual(len(statements), 1)
+        self.assertNotIn('"last_name"', statements[0])
+        account.refresh_from_db()
+        self.assertEqual((account.first_name, account.last_name, account.version), ('Juan', 'Martinez', 2))
+
+        # The same version can not be used twice
+        response = self.client.put(update_url, {'id': account.id, 'version': 1, 'first_name': 'Eva'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        response = self.client.delete(delete_url, {'id': account.id, 'version': 1}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+
+        response = self.client.put(update_url, {'id': foreign.id, 'first_name': 'Juan'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['errors']['non_field_error'], 'No permissions')
+        response = self.client.put(update_url, {'id': account.id, 'iban': foreign.iban}, format='json')
+        self.assertEqual(response.data['errors']['non_field_error'], 'iban already exists')
+
+        # Conditional DELETE + its tombstone
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.delete(delete_url, {'id': account.id, 'version': 2}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        statements = [query['sql'] for query in queries.captured_queries if 'SAVEPOINT' not in query['sql']]
+        self.assertEqual([statement.split()[0] for statement in statements], ['DELETE', 'INSERT'])
+        response = self.client.delete(delete_url, {'id': account.id}, format='json')
+        self.assertEqual(response.data['errors']['non_field_error'], 'Not exists')
+        self.assertEqual(Account.objects.count(), 1)
+
+    def test_accounts_batch(self):
+        """
+        Ensure a batch of operations is all or nothing by default, or best effort, with one result per operation
+        """
+        other = User.objects.create_user('other', 'other@other.com', 'other123')
+        account = Account.objects.create(first_name='Agustin', last_name='Martinez', iban='ES7620770024003102575766',
+                                         creator=self.user)
+        foreign = Account.objects.create(first_name='Eva', last_name='Perez', iban='GB82WEST12345698765432',
+                                         creator=other)
+        self.client.force_authenticate(user=self.user)
+        url = reverse('accounts:accounts_batch')
+        operations = [
+            {'op': 'add', 'first_name': 'Juan', 'last_name': 'Lopez', 'iban': 'DE89370400440532013000'},
+            {'op': 'update', 'id': account.id, 'version': 1, 'first_name': 'Juan'},
+            {'op': 'update', 'id': account.id, 'version': 2, 'last_name': 'Lopez'},
+            {'op': 'delete', 'id': foreign.id},
+            {'op': 'update', 'id': account.id, 'iban': foreign.iban},
+            {'op': 'add', 'first_name': 'Eva'},
+        ]
+        response = self.client.post(url, {'operations': operations}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual([result['status'] for result in response.data['results']],
+                         ['skipped', 'skipped', 'skipped', 'skipped', 'skipped', 'error'])
+
+        response = self.client.post(url, {'operations': operations[:5]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual([result['status'] for result in response.data['results']],
+                         ['rolled_back', 'rolled_back', 'rolled_back', 'no_permission', 'skipped'])
+        self.assertEqual(Account.objects.count(), 2)
+        self.assertEqual(Account.objects.get(id=account.id).version, 1)
+
+        response = self.client.post(url, {'mode': 'best_effort', 'operations': operations}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual([result['status'] for result in response.data['results']],
+                         ['created', 'updated', 'updated', 'no_permission', 'error', 'error'])
+        self.assertEqual(response.data['results'][2]['version'], 3)
+        account.refresh_from_db()
+        self.assertEqual((account.first_name, account.last_name, account.version), ('Juan', 'Lopez', 3))
+        self.assertTrue(Account.objects.filter(iban='DE89370400440532013000', creator=self.user).exists())
+
+        # Every run of operations of the same kind costs the same number of queries whatever its length
+        ids = list(Account.objects.filter(creator=self.user).values_list('id', flat=True))
+        operations = [{'op': 'update', 'id': pk, 'last_name': 'Perez'} for pk in ids]
+        operations += [{'op': 'delete', 'id': pk} for pk in ids]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(url, {'operations': operations}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        statements = [query['sql'] for query in queries.captured_queries if 'SAVEPOINT' not in query['sql']]
+        self.assertEqual([statement.split()[0] for statement in statements],
+                         ['SELECT', 'UPDATE', 'SELECT', 'DELETE', 'INSERT'])
+        self.assertEqual(list(Account.objects.values_list('id', flat=True)), [foreign.id])
+
+    def test_token_authentication_cache(self):
+        """
+        Ensure an already checked token is not queried again, and stops working as soon as we logout
+        """
+        token_cache.clear()
+        url = reverse('accounts:accounts')
+        response = self.client.get(url, HTTP_AUTHORIZATION=self.token)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        # Neither the token nor the (cached) listing needs the database anymore
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_AUTHORIZATION=self.token)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(token_cache.stats()['hits'], 1)
+        self.assertEqual(token_cache.stats()['misses'], 1)
+
+        response = self.client.post(reverse('logout'), HTTP_AUTHORIZATION=self.token)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.get(url, HTTP_AUTHORIZATION=self.token)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        # Deactivated users are rejected right away as well
+        self.token = 'Token ' + Token.objects.create(user=self.user).key
+        self.client.get(url, HTTP_AUTHORIZATION=self.token)
+        self.user.is_active = False
+        self.user.save()
+        response = self.client.get(url, HTTP_AUTHORIZATION=self.token)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_token_cache_shared_logout(self):
+        """
+        Ensure a token logged out in one process is refused right away by the others sharing the cache
+        """
+        token_cache.clear()
+        # The token cache of another process
+        other = TokenCache()
+        key = self.token.split()[1]
+        self.client.get(reverse('accounts:accounts'), HTTP_AUTHORIZATION=self.token)
+        self.assertEqual(other.get(key)[1].key, key)
+        # Kept by the other process itself from now on
+        self.assertEqual(other.get(key)[1].key, key)
+
+        response = self.client.post(reverse('logout'), HTTP_AUTHORIZATION=self.token)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIsNone(other.get(key))
+
+        # Same for the tokens of a modified user
+        key = Token.objects.create(user=self.user).key
+        token_cache.set(key, (self.user, Token.objects.get(key=key)))
+        self.assertIsNotNone(other.get(key))
+        self.user.save()
+        self.assertIsNone(other.get(key))
+
+    def test_token_expiry(self):
+        """
+        Ensure tokens expire when not used for a while, are refreshed when used, and the expired ones are purged
+        """
+        token_cache.clear()
+        url = reverse('accounts:accounts')
+        token = Token.objects.get(user=self.user)
+        with self.settings(TOKEN_EXPIRY={'LIFETIME': 3600, 'REFRESH_AFTER': 60}):
+            Token.objects.filter(pk=token.pk).update(created=timezone.now() - timedelta(seconds=120))
+            response = self.client.get(url, HTTP_AUTHORIZATION=self.token)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            refreshed = Token.objects.get(pk=token.pk).created
+            self.assertGreater(refreshed, timezone.now() - timedelta(seconds=60))
+            with self.assertNumQueries(0):
+                self.client.get(url, HTTP_AUTHORIZATION=self.token)
+            self.assertEqual(Token.objects.get(pk=token.pk).created, refreshed)
+
+            # Even the cached token stops working once it expires
+            token_cache.get(token.key)[1].created = timezone.now() - timedelta(seconds=3600)
+            response = self.client.get(url, HTTP_AUTHORIZATION=self.token)
+            self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+            users = [User.objects.create_user('user{0}'.format(i)) for i in range(5)]
+            Token.objects.bulk_create([Token(key='{0:040d}'.format(i), user=user) for i, user in enumerate(users)])
+            Token.objects.filter(key__in=['{0:040d}'.format(i) for i in range(3)]).update(
+                created=timezone.now() - timedelta(days=1))
+            out = StringIO()
+            call_command('purge_tokens', batch_size=2, stdout=out, stderr=StringIO())
+            self.assertEqual(out.getvalue().split()[0], '3')
+            self.assertEqual(Token.objects.count(), 3)
+
+            # A token refreshed between the select and the delete of its batch is kept
+            refreshing = '{0:040d}'.format(3)
+            Token.objects.filter(key=refreshing).update(created=timezone.now() - timedelta(days=1))
+            selects = []
+
+            def refresh(now=None):
+                selects.append(now)
+                if len(selects) == 2:
+                    Token.objects.filter(key=refreshing).update(created=timezone.now())
+                return expired_tokens(now)
+            with mock.patch('account.authentication.expired_tokens', side_effect=refresh):
+                self.assertEqual(list(purge_expired_tokens()), [0])
+            self.assertTrue(Token.objects.filter(key=refreshing).exists())
+
+            # Logging in again gives a new token
+            Token.objects.filter(pk=token.pk).update(created=timezone.now() - timedelta(days=1))
+            with stub_oauth2():
+                response = self.client.post(reverse('token_authentication', args=['stub']),
+                                            {'access_token': 'admin@admin.com'}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotEqual(response.data['token'], token.key)
+            self.assertFalse(Token.objects.filter(pk=token.pk).exists())
+
+    def test_token_authentication_exchange_cache(self):
+        """
+        Ensure the same access token is only exchanged with the provider once, until its token is logged out
+        """
+        exchange_cache.clear()
+        url = reverse('token_authentication', args=['stub'])
+        with stub_oauth2(), mock.patch.object(StubOAuth2, 'do_auth', autospec=True,
+                                              side_effect=StubOAuth2.do_auth) as do_auth:
+            response = self.client.post(url, {'access_token': 'eva@example.com'}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            token = response.data['token']
+            # Nothing to check with the provider, nor to save
+            with self.assertNumQueries(0):
+                response = self.client.post(url, {'access_token': 'eva@example.com'}, format='json')
+            self.assertEqual(response.data['token'], token)
+            self.assertEqual(do_auth.call_count, 1)
+
+            # The user is only saved when ADMIN_LIST changes for it
+            exchange_cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                self.client.post(url, {'access_token': 'eva@example.com'}, format='json')
+            self.assertFalse([query for query in queries if query['sql'].startswith('UPDATE')])
+            with self.settings(ADMIN_LIST=['admin@admin.com']):
+                response = self.client.post(url, {'access_token': 'juan@example.com'}, format='json')
+            self.assertEqual(response.data, {'errors': {'non_field_error': 'This user account is inactive'}})
+            self.assertFalse(User.objects.get(email='juan@example.com').is_staff)
+
+            response = self.client.post(reverse('logout'), HTTP_AUTHORIZATION='Token ' + token)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            response = self.client.post(url, {'access_token': 'eva@example.com'}, format='json')
+            self.assertNotEqual(response.data['token'], token)
+            self.assertEqual(do_auth.call_count, 4)
+
+            response = self.client.post(url, {'access_token': 'invalid'}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertEqual(response.data['errors']['token'], 'Invalid token')
+
+    def test_exchange_single_flight(self):
+        """
+        Ensure the concurrent exchanges of the same access token are collapsed into one
+        """
+        exchanges = ExchangeCache()
+        token = Token.objects.get(user=self.user)
+        started, release = threading.Event(), threading.Event()
+        calls, results = [], []
+
+        def exchange():
+            calls.append(1)
+            started.set()
+            release.wait()
+            return self.user, token
+
+        threads = [threading.Thread(target=lambda: results.append(exchanges.exchange('key', exchange)))
+                   for _ in range(5)]
+        threads[0].start()
+        started.wait()
+        for thread in threads[1:]:
+            thread.start()
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [(self.user, token)] * 5)
+
+        def fail():
+            raise HTTPError('401 Client Error')
+
+        with self.assertRaises(HTTPError):
+            exchanges.exchange('other', fail)
+        self.assertIsNone(exchanges.get('other'))
+
+    def test_get_all_accounts_cache(self):
+        """
+        Ensure the accounts listing is served from the cache until the accounts change
+        """
+        other = User.objects.create_user('other', 'other@other.com', 'other123')
+        Account.objects.create(first_name='Eva', last_name='Perez', iban='GB82WEST12345698765432', creator=other)
+        url = reverse('accounts:accounts')
+        with tempfile.TemporaryDirectory() as location:
+            caches_setting = {
+                'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+                'files': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location},
+            }
+            # Local memory is refused, each process would keep serving its own version after the writes of the others
+            with self.settings(CACHES=caches_setting, ACCOUNTS_CACHE='default'), \
+                    self.assertRaises(ImproperlyConfigured):
+                self.client.force_authenticate(user=self.user)
+                self.client.get(url, format='json')
+
+            with self.settings(CACHES=caches_setting, ACCOUNTS_CACHE='files'):
+                self.client.force_authenticate(user=self.user)
+                # Change marker (ETag) + shared rows + ids created by the user
+                with self.assertNumQueries(3):
+                    self.client.get(url, format='json')
+                with self.assertNumQueries(0):
+                    response = self.client.get(url, format='json')
+                self.assertEqual([row['is_editable'] for row in response.data], [False])
+
+                # A new account, created by us, invalidates the cached listing
+                response = self.client.post(reverse('accounts:accounts_add'), {
+                    'first_name': 'Agustin', 'last_name': 'Martinez', 'iban': 'ES7620770024003102575766',
+                }, format='json')
+                self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+                response = self.client.get(url, format='json')
+                self.assertEqual([row['is_editable'] for row in response.data], [False, True])
+
+                # Only the ids of the other user are queried when the shared part is already cached
+                self.client.force_authenticate(user=other)
+                with self.assertNumQueries(1):
+                    response = self.client.get(url, format='json')
+                self.assertEqual([row['is_editable'] for row in response.data], [True, False])
+
+    def test_get_accounts_etag(self):
+        """
+        Ensure the account listings answer 304 without reading any account while nothing changes
+        """
+        account = Account.objects.create(first_name='Agustin', last_name='Martinez', iban='ES7620770024003102575766',
+                                         creator=self.user)
+        self.client.force_authenticate(user=self.user)
+        for name in ('accounts:accounts', 'accounts:accounts_page'):
+            with self.subTest(url=name):
+                url = reverse(name)
+                response = self.client.get(url, format='json')
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                etag = response['ETag']
+
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.get(url, format='json', HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+                self.assertEqual(response.content, b'')
+                self.assertFalse([query for query in queries.captured_queries if '"first_name"' in query['sql']])
+
+                # Any modification changes the ETag
+                Account.objects.filter(id=account.id).update(first_name='Eva', version=F('version') + 1)
+                accounts_changed.send(sender=Account)
+                response = self.client.get(url, format='json', HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                self.assertNotEqual(response['ETag'], etag)
+
+    def test_get_accounts_etag_other_process(self):
+        """
+        Ensure a write served by another process changes the ETag, the marker is kept in the shared cache
+        """
+        account = Account.objects.create(first_name='Agustin', last_name='Martinez', iban='ES7620770024003102575766',
+                                         creator=self.user)
+        self.client.force_authenticate(user=self.user)
+        url = reverse('accounts:accounts')
+        etag = self.client.get(url, format='json')['ETag']
+
+        # The worker sends the signal of the write it served, what it changes in local memory is never seen here
+        Account.objects.filter(id=account.id).update(first_name='Eva', version=F('version') + 1)
+        worker = multiprocessing.get_context('fork').Process(target=accounts_changed.send, kwargs={'sender': Account})
+        worker.start()
+        worker.join()
+        self.assertEqual(worker.exitcode, 0)
+        response = self.client.get(url, format='json', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data[0]['first_name'], 'Eva')
+
+    def test_get_accounts_fields_and_formats(self):
+        """
+        Ensure the account listings only select and return the fields asked, as rows or columns, compressed if accepted
+        """
+        other = User.objects.create_user('other', 'other@other.com', 'other123')
+        mine, theirs = [
+            Account.objects.create(first_name='Name', last_name='Surname', iban=iban, creator=creator)
+            for iban, creator in (('ES7620770024003102575766', self.user), ('GB82WEST12345698765432', other))
+        ]
+        self.client.force_authenticate(user=self.user)
+        url = reverse('accounts:accounts_page')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {'fields': 'iban,is_editable'})
+        self.assertEqual(response.data['results'], [
+            {'iban': mine.iban, 'is_editable': True}, {'iban': theirs.iban, 'is_editable': False}])
+        self.assertFalse([query for query in queries.captured_queries if '"first_name"' in query['sql']])
+
+        response = self.client.get(url, {'fields': 'iban,password'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['errors']['fields'], 'Unknown fields: password')
+
+        columns = {'id': [mine.id, theirs.id], 'iban': [mine.iban, theirs.iban], 'is_editable': [True, False]}
+        for name in ('accounts:accounts', 'accounts:accounts_page', 'accounts:accounts_search'):
+            with self.subTest(url=name):
+                response = self.client.get(reverse(name), {'fields': 'id,iban,is_editable', 'format': 'columns'})
+                self.assertEqual(response['Content-Type'], 'application/vnd.accounts.columns+json')
+                data = json.loads(response.content.decode())
+                self.assertEqual(data if name == 'accounts:accounts' else data['results'], columns)
+
+        # Negotiated with the Accept header too, which changes the ETag
+        etag = self.client.get(url)['ETag']
+        response = self.client.get(url, HTTP_ACCEPT='application/vnd.accounts.columns+json', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(json.loads(response.content.decode())['results']['first_name'], ['Name', 'Name'])
+        self.assertIn('Accept', response['Vary'])
+
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(len(json.loads(gzip.decompress(response.content).decode())['results']), 2)
+
+    def test_get_accounts_changes(self):
+        """
+        Ensure the change feed returns only the creations, modifications and deletions since the given position
+        """
+        self.client.force_authenticate(user=self.user)
+        url = reverse('accounts:accounts_changes')
+        first, second, third = [
+            Account.objects.create(first_name='Name', last_name='Surname', iban=iban, creator=self.user)
+            for iban in ('ES7620770024003102575766', 'GB82WEST12345698765432', 'DE89370400440532013000')
+        ]
+        with self.settings(ACCOUNTS_CHANGES_SETTLE_SECONDS=0, ACCOUNTS_PAGE_SIZE=2):
+            response = self.client.get(url, format='json')
+            self.assertEqual([change['account']['id'] for change in response.data['changes']], [first.id, second.id])
+            self.assertTrue(response.data['has_more'])
+            response = self.client.get(url, {'since': response.data['since']}, format='json')
+            self.assertEqual([change['account']['id'] for change in response.data['changes']], [third.id])
+            self.assertFalse(response.data['has_more'])
+            since = response.data['since']
+
+            response = self.client.get(url, {'since': since}, format='json')
+            self.assertEqual(response.data['changes'], [])
+
+            self.client.put(reverse('accounts:accounts_modify'), {'id': second.id, 'first_name': 'Eva'}, format='json')
+            self.client.delete(reverse('accounts:accounts_delete'), {'id': first.id}, format='json')
+            response = self.client.get(url, {'since': since}, format='json')
+            self.assertEqual(response.data['changes'][0]['account']['first_name'], 'Eva')
+            self.assertEqual(response.data['changes'][1], {'type': 'deleted', 'id': first.id})
+
+            response = self.client.get(url, {'since': 'invalid'}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class BenchmarkTests(APITestCase):
+    def test_endpoints_query_budgets(self):
+        """
+        Ensure every request of the API does the number of queries of the checked-in budgets
+        """
+        results = {'endpoints': load('endpoints').run([20], 2)}
+        with open(BUDGETS_FILE) as f:
+            budgets = json.load(f)['endpoints']
+        for size_budgets in budgets.values():
+            for endpoint, limits in size_budgets.items():
+                self.assertEqual(results['endpoints'][0][endpoint]['queries'], limits['queries'], endpoint)
+
+        self.assertEqual(check_budgets(results, {'endpoints': {'20': {'accounts': {'queries': 0}}}}), [])
+        exceeded = check_budgets(results, {'endpoints': {'20': {'accounts_add': {'queries': 0}}}})
+        self.assertEqual(exceeded, ['endpoints accounts_add (size 20): queries = 1, budget 0'])
+        # Nothing created by the benchmark is kept
+        self.assertFalse(Account.objects.exists())
+
+
+class ReplicaTests(APITestCase):
+    databases = {'default', 'replica'}
+
+    @classmethod
+    def setUpClass(cls):
+        """
+        Add a replica (another SQLite file) with an account the primary does not have
+        """
+        cls.replica_file = tempfile.mkstemp(suffix='.sqlite3')[1]
+        connections.databases['replica'] = {'ENGINE': 'django.db.backends.sqlite3', 'NAME': cls.replica_file}
+        replica = connections['replica']
+        with replica.schema_editor() as editor:
+            editor.create_model(User)
+            editor.create_model(Account)
+        creator = User.objects.db_manager('replica').create_user('replica', 'replica@admin.com', 'replica123')
+        Account.objects.using('replica').create(first_name='Replica', last_name='Only',
+                                                iban='ES7620770024003102575766', creator=creator)
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections['replica'].close()
+        del connections.databases['replica']
+        delattr(connections._connections, 'replica')
+        os.remove(cls.replica_file)
+
+    def setUp(self):
+        cache.clear()
+        caches['shared'].clear()
+        self.user = User.objects.create_user('admin', 'admin@admin.com', 'admin123')
+        self.token = 'Token ' + Token.objects.create(user=self.user).key
+        self.client.credentials(HTTP_AUTHORIZATION=self.token)
+
+    def test_replica_routing(self):
+        """
+        Ensure the GET views read the replicas, except the primary views and right after a write of the same token
+        """
+        def page_names():
+            response = self.client.get(reverse('accounts:accounts_page'), format='json')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            return [row['first_name'] for row in response.data['results']]
+
+        with self.settings(DATABASE_REPLICAS=dict(settings.DATABASE_REPLICAS, REPLICAS={'replica': 1})):
+            before = snapshot().get('accounts:accounts_page', [0] * 5)[QUERIES]
+            with CaptureQueriesContext(connection) as primary, CaptureQueriesContext(connections['replica']) as replica:
+                self.assertEqual(page_names(), ['Replica'])
+            # The queries sent to the replicas are counted too
+            self.assertTrue(replica.captured_queries)
+            self.assertEqual(snapshot()['accounts:accounts_page'][QUERIES] - before,
+                             len(primary.captured_queries) + len(replica.captured_queries))
+            # The marker of the ETag comes from the primary, which can be ahead of the replica
+            self.assertNotIn('ETag', self.client.get(reverse('accounts:accounts_page'), format='json'))
+            response = self.client.get(reverse('accounts:accounts'), format='json')
+            self.assertEqual(response.data, [])
+
+            response = self.client.post(reverse('accounts:accounts_add'), {
+                'first_name': 'Agustin', 'last_name': 'Martinez', 'iban': 'GB82WEST12345698765432'}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            self.assertEqual(page_names(), ['Agustin'])
+            # Another token did not write anything
+            other = User.objects.create_user('other', 'other@admin.com', 'other123')
+            self.client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.create(user=other).key)
+            self.assertEqual(page_names(), ['Replica'])
+
+            # Back to the replicas once the stickiness expires
+            caches['shared'].clear()
+            self.client.credentials(HTTP_AUTHORIZATION=self.token)
+            self.assertEqual(page_names(), ['Replica'])
+
+        self.assertIn('ETag', self.client.get(reverse('accounts:accounts_page'), format='json'))
+
+        # The stickiness must be seen by all the processes
+        local = dict(settings.DATABASE_REPLICAS, REPLICAS={'replica': 1}, CACHE='default')
+        with self.settings(DATABASE_REPLICAS=local), self.assertRaises(ImproperlyConfigured):
+            page_names()
+
+
+class ConnectionPoolTests(SimpleTestCase):
+    def test_connection_pool(self):
+        """
+        Ensure the pool reuses the returned connections, replaces the broken ones and bounds how many are open
+        """
+        pool = ConnectionPool(lambda: sqlite3.connect(':memory:', check_same_thread=False), max_size=2, timeout=0.1,
+                              check_after=0)
+        first, second = pool.checkout(), pool.checkout()
+        with self.assertRaises(PoolTimeout):
+            pool.checkout()
+        pool.checkin(first)
+        self.assertIs(pool.checkout(), first)
+        pool.timeout = 5
+
+        # Waiting for a connection to be returned
+        taken = []
+        thread = threading.Thread(target=lambda: taken.append(pool.checkout()))
+        thread.start()
+        while pool.stats()['waits'] < 2:
+            time.sleep(0.001)
+        pool.checkin(second)
+        thread.join()
+        self.assertEqual(taken, [second])
+
+        first.close()
+        pool.checkin(first)
+        self.assertIsNot(pool.checkout(), first)
+        self.assertEqual(pool.stats(), {
+            'max_size': 2, 'open': 2, 'idle': 0, 'in_use': 2, 'checkouts': 5, 'created': 3, 'discarded': 1,
+            'waits': 2, 'wait_seconds': pool.wait_seconds, 'timeouts': 1})
+
+    def test_pooled_backend(self):
+        """
+        Ensure the connections closed at the end of the requests go back to the pool, and the persistent ones are
+        replaced when they stop working
+        """
+        path = tempfile.mkstemp(suffix='.sqlite3')[1]
+        self.addCleanup(os.remove, path)
+        for alias, options in (('pooled', {'CONN_MAX_AGE': 0, 'POOL': {'MAX_SIZE': 2}}),
+                               ('persistent', {'CONN_MAX_AGE': 600, 'CONN_HEALTH_CHECKS': True})):
+            connections.databases[alias] = dict(options, ENGINE='account.db.sqlite3', NAME=path)
+            self.addCleanup(delattr, connections._connections, alias)
+            self.addCleanup(connections.databases.pop, alias)
+            self.addCleanup(connections[alias].close)
+
+        pooled = connections['pooled']
+        for _ in range(3):
+            # Like every request does
+            pooled.cursor().execute('SELECT 1')
+            pooled.close_if_unusable_or_obsolete()
+        self.assertEqual(pool_stats()['pooled']['created'], 1)
+        self.assertEqual(pool_stats()['pooled']['checkouts'], 3)
+        self.assertIn('db_pool_checkouts_total{database="pooled"} 3', render_metrics({}))
+
+        persistent = connections['persistent']
+        persistent.cursor()
+        first = persistent.connection
+        persistent.close_if_unusable_or_obsolete()
+        persistent.cursor()
+        self.assertIs(persistent.connection, first)
+        persistent.close_if_unusable_or_obsolete()
+        with mock.patch.object(type(persistent), 'is_usable', return_value=False):
+            persistent.cursor()
+        self.assertIsNot(persistent.connection, first)
+
+
+class IbanTests(SimpleTestCase):
+    def test_verify_ibans(self):
+        """
+        Ensure IBANs are checked against the format of their country before their check digits
+        """
+        results = list(verify_ibans([
+            'ES7620770024003102575766', 'gb82 west 1234 5698 7654 32', 'MT84MALT011000012345MTLCAST001S',
+            'ES762077002400310257576', 'ES76207700240031025757660', 'ES76207700240031025757AA', 'XX7620770024003',
+            'ES7620770024003102575767',
+        ]))
+        self.assertEqual([result.error for result in results], [
+            None, None, None, 'IBAN is too short', 'IBAN is too long', 'IBAN has not the correct format',
+            'IBAN country is not valid', 'IBAN has not the correct format',
+        ])
+        self.assertEqual(results[1].iban, 'GB82WEST12345698765432')
+        self.assertEqual(build_iban('ES', '20770024003102575766'), 'ES7620770024003102575766')
+        with self.assertRaises(ValidationError):
+            verify_iban('ES7620770024003102575767')
+
+
+class AccountSearchTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        """
+        Create enough accounts for the database to prefer the indexes over reading the whole table
+        """
+        cls.user = User.objects.create_user('admin', 'admin@admin.com', 'admin123')
+        cls.other = User.objects.create_user('other', 'other@admin.com', 'other123')
+        names = ['Agustin', 'Eva', 'Juan', 'Maria', 'Pedro', 'Lucia', 'Carlos', 'Ana', 'Sofia', 'Diego']
+        accounts = [
+            Account(first_name='{0}{1}'.format(names[i % 10], i), last_name=names[i // 10 % 10],
+                    iban=build_iban(('ES', 'DE', 'NL')[i % 3], '{0:018d}'.format(i)),
+                    creator=cls.user if i % 4 == 0 else cls.other)
+            for i in range(5000)
+        ]
+        Account.objects.bulk_create(accounts, batch_size=insert_batch_size(accounts, 1000))
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def assertIndexScan(self, queryset, index=None):
+        plan = queryset.order_by('id')[:100].explain()
+        if connection.vendor == 'postgresql':
+            self.assertNotIn('Seq Scan', plan)
+        else:
+            self.assertNotRegex(plan, r'\bSCAN account_account\b')
+            self.assertIn('INDEX', plan)
+        if index:
+            self.assertIn(index, plan)
+
+    def test_search_uses_indexes(self):
+        """
+        Ensure every search filter is resolved with an index scan
+        """
+        self.assertIndexScan(search_accounts(first_name='agus'), 'account_first_name_search_idx')
+        self.assertIndexScan(search_accounts(last_name='EV'), 'account_last_name_search_idx')
+        self.assertIndexScan(search_accounts(iban='DE'))
+
+    def test_search_accounts(self):
+        """
+        Ensure we can search accounts by the beginning of the names and the IBAN, page by page
+        """
+        self.client.force_authenticate(user=self.user)
+        url = reverse('accounts:accounts_search')
+        response = self.client.get(url, {'first_name': 'agustin1', 'page_size': 5}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 5)
+        self.assertTrue(all(row['first_name'].startswith('Agustin1') for row in response.data['results']))
+        self.assertIsNotNone(response.data['next'])
+
+        response = self.client.get(url, {'first_name': 'eva', 'last_name': 'jUaN', 'iban': 'nl'}, format='json')
+        ids = sorted(row['id'] for row in response.data['results'])
+        self.assertEqual(ids, list(Account.objects.filter(
+            first_name__startswith='Eva', last_name='Juan', iban__startswith='NL').order_by('id').values_list(
+            'id', flat=True)))
+        self.assertTrue(ids)
+
+        # A blank IBAN prefix is no filter at all
+        response = self.client.get(url, {'iban': ' ', 'page_size': 5}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 5)
+
+    def test_mine_uses_index(self):
+        """
+        Ensure every page of the user accounts is one range of the (creator, id) index, without sorting
+        """
+        plan = Account.objects.filter(creator_id=self.user.pk, id__gt=100).order_by('id')[:100].explain()
+        if connection.vendor == 'postgresql':
+            self.assertIn('account_acc_creator_183bde_idx', plan)
+            self.assertNotIn('Sort', plan)
+        else:
+            self.assertIn('account_acc_creator_183bde_idx (creator_id=? AND id>?)', plan)
+            self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_get_my_accounts(self):
+        """
+        Ensure we only get the accounts created by the user, page by page
+        """
+        self.client.force_authenticate(user=self.user)
+        url = reverse('accounts:accounts_mine')
+        ids = []
+        params = {'page_size': 500}
+        while True:
+            response = self.client.get(url, params, format='json')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertTrue(all(row['is_editable'] for row in response.data['results']))
+            ids.extend(row['id'] for row in response.data['results'])
+            if not response.data['next']:
+                break
+            params = {'page_size': 500, 'cursor': parse_qs(urlparse(response.data['next']).query)['cursor'][0]}
+        self.assertEqual(len(ids), 1250)
+        self.assertEqual(ids, list(Account.objects.filter(creator=self.user).order_by('id').values_list(
+            'id', flat=True)))
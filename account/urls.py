@@ -20,7 +20,14 @@ app_name = 'accounts'
 
 urlpatterns = [
     path('get/all', views.accounts, name='accounts'),
+    path('get/page', views.accounts_page, name='accounts_page'),
+    path('mine/', views.accounts_mine, name='accounts_mine'),
+    path('search/', views.accounts_search, name='accounts_search'),
+    path('changes/', views.accounts_changes, name='accounts_changes'),
+    path('export/', views.accounts_export, name='accounts_export'),
     path('add/', views.accounts_add, name='accounts_add'),
+    path('add/bulk/', views.accounts_add_bulk, name='accounts_add_bulk'),
     path('update/', views.accounts_modify, name='accounts_modify'),
     path('delete/', views.accounts_delete, name='accounts_delete'),
+    path('batch/', views.accounts_batch, name='accounts_batch'),
 ]
@@ -1,5 +1,8 @@
-from rest_framework import serializers
+import re
 import string
+from collections import namedtuple
+
+from rest_framework import serializers
 
 # Method from: https://en.wikipedia.org/wiki/International_Bank_Account_Number#Algorithms
 
@@ -7,21 +10,113 @@ import string
 
 LETTERS = {ord(d): str(i) for i, d in enumerate(string.digits + string.ascii_uppercase)}
 
+# BBAN (Basic Bank Account Number) structure of every country, from the SWIFT IBAN registry
+# n: digits, a: upper case letters, c: upper case letters and digits, and the number of them before each one
+BBAN_FORMATS = {
+    'AD': '4!n4!n12!c', 'AE': '3!n16!n', 'AL': '8!n16!c', 'AT': '5!n11!n', 'AZ': '4!a20!c', 'BA': '3!n3!n8!n2!n',
+    'BE': '3!n7!n2!n', 'BG': '4!a4!n2!n8!c', 'BH': '4!a14!c', 'BI': '5!n5!n11!n2!n', 'BR': '8!n5!n10!n1!a1!c',
+    'BY': '4!c4!n16!c', 'CH': '5!n12!c', 'CR': '4!n14!n', 'CY': '3!n5!n16!c', 'CZ': '4!n6!n10!n', 'DE': '8!n10!n',
+    'DJ': '5!n5!n11!n2!n', 'DK': '4!n9!n1!n', 'DO': '4!c20!n', 'EE': '2!n2!n11!n1!n', 'EG': '4!n4!n17!n',
+    'ES': '4!n4!n1!n1!n10!n', 'FI': '3!n11!n', 'FK': '2!a12!n', 'FO': '4!n9!n1!n', 'FR': '5!n5!n11!c2!n',
+    'GB': '4!a6!n8!n', 'GE': '2!a16!n', 'GI': '4!a15!c', 'GL': '4!n9!n1!n', 'GR': '3!n4!n16!c', 'GT': '4!c20!c',
+    'HN': '4!a20!n', 'HR': '7!n10!n', 'HU': '3!n4!n1!n15!n1!n', 'IE': '4!a6!n8!n', 'IL': '3!n3!n13!n',
+    'IQ': '4!a3!n12!n', 'IS': '4!n2!n6!n10!n', 'IT': '1!a5!n5!n12!c', 'JO': '4!a4!n18!c', 'KW': '4!a22!c',
+    'KZ': '3!n13!c', 'LB': '4!n20!c', 'LC': '4!a24!c', 'LI': '5!n12!c', 'LT': '5!n11!n', 'LU': '3!n13!c',
+    'LV': '4!a13!c', 'LY': '3!n3!n15!n', 'MC': '5!n5!n11!c2!n', 'MD': '2!c18!c', 'ME': '3!n13!n2!n',
+    'MK': '3!n10!c2!n', 'MN': '4!n12!n', 'MR': '5!n5!n11!n2!n', 'MT': '4!a5!n18!c', 'MU': '4!a2!n2!n12!n3!n3!a',
+    'NI': '4!a20!n', 'NL': '4!a10!n', 'NO': '4!n6!n1!n', 'OM': '3!n16!c', 'PK': '4!a16!c', 'PL': '8!n16!n',
+    'PS': '4!a21!c', 'PT': '4!n4!n11!n2!n', 'QA': '4!a21!c', 'RO': '4!a16!c', 'RS': '3!n13!n2!n',
+    'RU': '9!n5!n15!c', 'SA': '2!n18!c', 'SC': '4!a2!n2!n16!n3!a', 'SD': '2!n12!n', 'SE': '3!n16!n1!n',
+    'SI': '5!n8!n2!n', 'SK': '4!n6!n10!n', 'SM': '1!a5!n5!n12!c', 'SO': '4!n3!n12!n', 'ST': '4!n4!n11!n2!n',
+    'SV': '4!a20!n', 'TL': '3!n14!n2!n', 'TN': '2!n3!n13!n2!n', 'TR': '5!n1!n16!c', 'UA': '6!n19!c',
+    'VA': '3!n15!n', 'VG': '4!a16!n', 'XK': '4!n10!n2!n', 'YE': '4!a4!n18!c',
+}
+
+CHARACTER_CLASSES = {'n': '[0-9]', 'a': '[A-Z]', 'c': '[A-Z0-9]'}
+
+
+def bban_parts(bban_format):
+    """
+    Split the registry notation of a BBAN into (number of characters, kind of characters) pairs
+    """
+    return [(int(count), kind) for count, kind in re.findall(r'(\d+)!([nac])', bban_format)]
+
+
+def _compile(country, bban_format):
+    # Converting the registry notation into the IBAN length (country + check digits + BBAN), a regular expression,
+    # the country code already converted to digits and if the BBAN can only have digits
+    parts = bban_parts(bban_format)
+    pattern = '[0-9]{2}' + ''.join('{0}{{{1}}}'.format(CHARACTER_CLASSES[kind], count) for count, kind in parts)
+    numeric = all(kind == 'n' for _, kind in parts)
+    return 4 + sum(count for count, _ in parts), re.compile(pattern), country.translate(LETTERS), numeric
+
+
+# Country code: (IBAN length, pattern of the check digits + BBAN, country code as digits, BBAN only has digits)
+COUNTRIES = {country: _compile(country, bban_format) for country, bban_format in BBAN_FORMATS.items()}
+
+# Result of the validation of one IBAN: the normalized IBAN, and the error message if it is not valid
+IbanResult = namedtuple('IbanResult', ('iban', 'error'))
+
 
 # Move the four initial characters to the end of the string, and replacing the dictionary values
 def process_iban(iban):
     return (iban[4:] + iban[:4]).translate(LETTERS)
 
 
-# Interpret the string as a decimal integer and compute the remainder of that number on division by 97
-def verify_iban(iban):
-    iban_fixed = iban.replace(' ', '')
-
-    # IBAN must has at least more than 5 characters and no more than 34
-    if 5 < len(iban_fixed) < 34:
-        if int(process_iban(iban_fixed)) % 97 == 1:
-            return iban_fixed
-        else:
-            raise serializers.ValidationError("IBAN has not the correct format")
+# Compute the remainder on division by 97 of the number written in the digits. The IBAN length is checked before,
+# so the number has at most 68 digits: CPython converts it and divides it in C faster than any loop over fixed
+# width chunks written in Python (see `python manage.py benchmark iban`)
+def mod97(digits):
+    return int(digits) % 97
+
+
+def check_iban(iban):
+    """
+    Validate one IBAN without raising, returning an IbanResult.
+
+    The cheap checks (country, exact length and BBAN structure) are done first, the checksum only for the IBANs
+    passing them
+    """
+    iban_fixed = iban.replace(' ', '').upper()
+    country = COUNTRIES.get(iban_fixed[:2])
+    if country is None:
+        return IbanResult(iban_fixed, 'IBAN country is not valid')
+
+    length, pattern, country_digits, numeric = country
+    if len(iban_fixed) < length:
+        return IbanResult(iban_fixed, 'IBAN is too short')
+    if len(iban_fixed) > length:
+        return IbanResult(iban_fixed, 'IBAN is too long')
+    if not pattern.fullmatch(iban_fixed, 2):
+        return IbanResult(iban_fixed, 'IBAN has not the correct format')
+
+    # Only the country code needs to be converted when the BBAN can only have digits
+    if numeric:
+        digits = iban_fixed[4:] + country_digits + iban_fixed[2:4]
     else:
-        raise serializers.ValidationError("IBAN is too short")
+        digits = process_iban(iban_fixed)
+    if mod97(digits) != 1:
+        return IbanResult(iban_fixed, 'IBAN has not the correct format')
+    return IbanResult(iban_fixed, None)
+
+
+def verify_ibans(ibans):
+    """
+    Validate several IBANs lazily, yielding one IbanResult per IBAN in the same order
+    """
+    return map(check_iban, ibans)
+
+
+# Validator raising the error of the IBAN, if any, and returning it normalized (no spaces and upper case)
+def verify_iban(iban):
+    result = check_iban(iban)
+    if result.error:
+        raise serializers.ValidationError(result.error)
+    return result.iban
+
+
+def build_iban(country, bban):
+    """
+    Build a valid IBAN for the country and BBAN, computing its check digits
+    """
+    return '{0}{1:02d}{2}'.format(country, 98 - mod97(process_iban(country + '00' + bban)), bban)
@@ -1,18 +1,137 @@
+from operator import itemgetter
+
 from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.views.decorators.gzip import gzip_page
+from django.views.decorators.http import condition
+from django.views.decorators.vary import vary_on_headers
 
 from requests.exceptions import HTTPError
 
 from rest_framework import status
 from rest_framework.authtoken.models import Token
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, renderer_classes
 from rest_framework.parsers import JSONParser
-from rest_framework.permissions import AllowAny
+from rest_framework.permissions import AllowAny, IsAdminUser
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 
+from social_core.exceptions import AuthCanceled, AuthForbidden
 from social_django.utils import psa
 
+from account.authentication import exchange_cache, token_expired
+from account.cache import accounts_etag, cached_account_list, cached_account_rows
+from account.changes import changes_since, decode_position, encode_position
+from account.export import EXPORT_FORMATS, export_accounts
+from account.metrics import render_metrics
 from account.models import Account
+from account.operations import (
+    CONFLICT, CREATED, DELETED, NO_PERMISSION, NOT_FOUND, UPDATED, bulk_create_accounts, delete_account, run_batch,
+    update_account,
+)
+from account.pagination import AccountCursorPagination
+from account.profiling import list_profiles, read_profile
+from account.renderers import ColumnarJSONRenderer
+from account.search import search_accounts
 from account.serializers import SocialSerializer, AccountSerializer
+from account.signals import accounts_changed
+
+# Only the columns needed to render the account listings, the creator is compared by id so `User` is never loaded
+ACCOUNT_LIST_FIELDS = ('id', 'first_name', 'last_name', 'iban', 'version', 'creator_id')
+
+# Fields of the account listings, the ones the clients can choose with `?fields=`
+ACCOUNT_FIELDS = ('id', 'first_name', 'last_name', 'iban', 'version', 'is_editable')
+
+# The account listings can also be rendered as one array per field (`?format=columns`)
+LISTING_RENDERERS = list(api_settings.DEFAULT_RENDERER_CLASSES) + [ColumnarJSONRenderer]
+
+
+def requested_fields(request):
+    """
+        Return the fields of the listing asked in `?fields=` (comma separated, all of them if not given), in their
+        usual order. Raise ValueError for the unknown ones
+    """
+    value = request.query_params.get('fields')
+    if not value:
+        return ACCOUNT_FIELDS
+    requested = {field.strip() for field in value.split(',')} - {''}
+    unknown = requested.difference(ACCOUNT_FIELDS)
+    if unknown or not requested:
+        raise ValueError('Unknown fields: {0}'.format(', '.join(sorted(unknown))))
+    return tuple(field for field in ACCOUNT_FIELDS if field in requested)
+
+
+def list_columns(fields):
+    """
+        Return the columns to select for the given fields, `id` is always needed by the pagination
+    """
+    columns = ['id'] + [field for field in fields if field not in ('id', 'is_editable')]
+    if 'is_editable' in fields:
+        columns.append('creator_id')
+    return columns
+
+
+def fields_error_response(error):
+    return Response(
+        {
+            'errors': {
+                'fields': str(error),
+            }
+        },
+        status=status.HTTP_400_BAD_REQUEST,
+    )
+
+
+def account_list_data(rows, user, fields=ACCOUNT_FIELDS, columnar=False, is_editable=None):
+    """
+        Build the public representation of the account rows (as returned by `values(*list_columns(fields))`) with
+        the given fields, as one object per account or, if `columnar`, one list per field
+    """
+    if fields != ACCOUNT_FIELDS or columnar:
+        if is_editable is None:
+            def is_editable(row):
+                return row['creator_id'] == user.pk
+        getters = [(field, is_editable if field == 'is_editable' else itemgetter(field)) for field in fields]
+        if columnar:
+            return {field: list(map(getter, rows)) for field, getter in getters}
+        return [{field: getter(row) for field, getter in getters} for row in rows]
+
+    return [
+        {
+            'id': row['id'],
+            'first_name': row['first_name'],
+            'last_name': row['last_name'],
+            'iban': row['iban'],
+            'version': row['version'],
+            # If the user doing the request is the same who created it, enabling the modification/deletion rights
+            'is_editable': row['creator_id'] == user.pk,
+        }
+        for row in rows
+    ]
+
+
+# Error message and status returned when a modification/deletion is not done
+WRITE_ERRORS = {
+    NOT_FOUND: ('Not exists', status.HTTP_400_BAD_REQUEST),
+    NO_PERMISSION: ('No permissions', status.HTTP_400_BAD_REQUEST),
+    CONFLICT: ('Modified in the meantime, reload it and try again', status.HTTP_409_CONFLICT),
+}
+
+
+def write_error_response(result, nfe):
+    """
+        Build the error response for a modification/deletion that was not done
+    """
+    message, error_status = WRITE_ERRORS[result]
+    return Response(
+        {
+            'errors': {
+                nfe: message,
+            }
+        },
+        status=error_status,
+    )
 
 
 @api_view(http_method_names=['POST'])
@@ -25,7 +144,9 @@ def token_authentication(request, backend):
     This simply defers the entire OAuth2 process to the front end.
     The front end becomes responsible for handling the entirety of the
     OAuth2 process; we just step in at the end and use the access token
-    to populate some user identity.
+    to populate some user identity. The same access token is only
+    checked once with the provider every `OAUTH2_EXCHANGE_CACHE['TTL']`
+    seconds, while the API token it gave is still valid.
 
     ## Request format
 
@@ -44,14 +165,38 @@ def token_authentication(request, backend):
         except AttributeError:
             nfe = 'non_field_errors'
 
+        def exchange():
+            # Authenticating in provider side (in our case only Google right now)
+            exchanged_user = request.backend.do_auth(access_token)
+            if not exchanged_user:
+                return None
+            # If the user is allowed
+            allowed = exchanged_user.email in settings.ADMIN_LIST or '*' in settings.ADMIN_LIST
+            if exchanged_user.is_active != allowed or exchanged_user.is_staff != allowed:
+                # Save the information only when the changes in ADMIN_LIST affect the user
+                exchanged_user.is_active = allowed
+                exchanged_user.is_staff = allowed
+                exchanged_user.save(update_fields=['is_active', 'is_staff'])
+            if not allowed:
+                return exchanged_user, None
+            token, created = Token.objects.get_or_create(user=exchanged_user)
+            if not created and token_expired(token):
+                # Rotating the expired token, the old one is never accepted again
+                token.delete()
+                token = Token.objects.create(user=exchanged_user)
+            return exchanged_user, token
+
         try:
             # Getting the token from the request after validated
-            token = serializer.validated_data['access_token']
-            if token:
-                # Authenticating in provider side (in our case only Google right now)
-                user = request.backend.do_auth(token)
-        except HTTPError as e:
-            # Error authenticating in provider side (in our case only Google right now)
+            access_token = serializer.validated_data['access_token']
+            if access_token:
+                # Reusing the recent exchanges of the same access token, waiting for the one in progress if any
+                exchanged = exchange_cache.exchange(exchange_cache.key(request.backend.name, access_token), exchange)
+                if exchanged is not None:
+                    user, token = exchanged
+        except (HTTPError, AuthCanceled, AuthForbidden) as e:
+            # Error authenticating in provider side (in our case only Google right now), social_core turns the 400
+            # and 401 responses into its own exceptions
             return Response(
                 {'errors': {
                     'token': 'Invalid token',
@@ -61,18 +206,7 @@ def token_authentication(request, backend):
             )
 
         if user:
-            # If the user is allowed
-            if user.email in settings.ADMIN_LIST or settings.ADMIN_LIST:
-                user.is_active = True
-                user.is_staff = True
-            else:
-                user.is_active = False
-                user.is_staff = False
-            # Save the information preventing the changes in ADMIN_LIST
-            user.save()
-
             if user.is_active:
-                token, _ = Token.objects.get_or_create(user=user)
                 return Response({'token': token.key})
             else:
                 # If the account registered has not admin rights, will be inactive
@@ -94,38 +228,150 @@ def logout(request):
     """
         Execute the logout functionality, which remove the current token for the user
     """
-    token = Token.objects.get(user=request.user)
-    token.delete()
+    if isinstance(request.auth, Token):
+        # The token already loaded by the authentication
+        request.auth.delete()
+    else:
+        Token.objects.filter(user=request.user).delete()
     return Response(status=status.HTTP_200_OK)
 
 
+@gzip_page
+@vary_on_headers('Accept')
 @api_view(http_method_names=['GET'])
+@renderer_classes(LISTING_RENDERERS)
+@condition(etag_func=accounts_etag)
 def accounts(request):
     """
         Function to get all the accounts data from database and show them in the accounts.html
     """
-    # Creating the default values
-    accounts_data = []
-    editable = False
+    try:
+        fields = requested_fields(request)
+    except ValueError as e:
+        return fields_error_response(e)
+    columnar = request.accepted_renderer.format == ColumnarJSONRenderer.format
+
+    # Retrieving the listing shared by all the users from the cache (rebuilt only when the accounts change), plus
+    # the ids of the accounts created by the user to enable the modification/deletion rights
+    if fields == ACCOUNT_FIELDS and not columnar:
+        return Response(cached_account_list(request.user))
+    rows, owned = cached_account_rows(request.user)
+    return Response(account_list_data(rows, request.user, fields, columnar, is_editable=lambda row: row['id'] in owned))
 
-    # Checking that the user doing the request is already logged in
-    if request.user:
-        # Retrieving all the account list
-        for account in Account.objects.all():
-            # If the user doing the request is the same who created it, enabling the modification/deletion rights
-            if account.creator == request.user:
-                editable = True
-            else:
-                editable = False
-            accounts_data.append({
-                'id': account.id,
-                'first_name': account.first_name,
-                'last_name': account.last_name,
-                'iban': account.iban,
-                'is_editable': editable,
-            })
 
-    return Response(accounts_data)
+def paginated_account_list(request, queryset):
+    """
+        Build the response with one page of the accounts of the queryset, only selecting and rendering the fields
+        asked in `?fields=`, in the format chosen by the client
+    """
+    try:
+        fields = requested_fields(request)
+    except ValueError as e:
+        return fields_error_response(e)
+    columnar = request.accepted_renderer.format == ColumnarJSONRenderer.format
+
+    paginator = AccountCursorPagination()
+    rows = paginator.paginate_queryset(queryset.values(*list_columns(fields)), request)
+    return paginator.get_paginated_response(account_list_data(rows, request.user, fields, columnar))
+
+
+@gzip_page
+@vary_on_headers('Accept')
+@api_view(http_method_names=['GET'])
+@renderer_classes(LISTING_RENDERERS)
+@condition(etag_func=accounts_etag)
+def accounts_page(request):
+    """
+        Function to get one page of the accounts, using the `cursor` and `page_size` parameters to move through them
+    """
+    return paginated_account_list(request, Account.objects.all())
+
+
+@gzip_page
+@vary_on_headers('Accept')
+@api_view(http_method_names=['GET'])
+@renderer_classes(LISTING_RENDERERS)
+@condition(etag_func=accounts_etag)
+def accounts_mine(request):
+    """
+        Function to get only the accounts created by the user, page by page like `accounts_page`
+    """
+    # Every page is one range of the (creator, id) index, whatever the number of accounts of the other users
+    return paginated_account_list(request, Account.objects.filter(creator_id=request.user.pk))
+
+
+@gzip_page
+@vary_on_headers('Accept')
+@api_view(http_method_names=['GET'])
+@renderer_classes(LISTING_RENDERERS)
+@condition(etag_func=accounts_etag)
+def accounts_search(request):
+    """
+        Function to search the accounts by the beginning of `first_name`, `last_name` and/or `iban` (like the
+        country code), page by page like `accounts_page`
+    """
+    queryset = search_accounts(
+        first_name=request.query_params.get('first_name'),
+        last_name=request.query_params.get('last_name'),
+        iban=request.query_params.get('iban'),
+    )
+    return paginated_account_list(request, queryset)
+
+
+@api_view(http_method_names=['GET'])
+def accounts_changes(request):
+    """
+        Function to get the accounts created, modified or deleted since the position given in `since` (all the
+        accounts if not given), page by page, returning the position to use in the next call
+    """
+    position = None
+    if request.query_params.get('since'):
+        try:
+            position = decode_position(request.query_params['since'])
+        except ValueError:
+            return Response(
+                {
+                    'errors': {
+                        'since': 'Invalid token',
+                    }
+                },
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+    limit = AccountCursorPagination().get_page_size(request)
+    changes, position, has_more = changes_since(position, limit, ACCOUNT_LIST_FIELDS)
+    rows = iter(account_list_data([row for _, _, row in changes if row is not None], request.user))
+    return Response({
+        'changes': [
+            {'type': 'updated', 'account': next(rows)} if row is not None else {'type': 'deleted', 'id': account_id}
+            for _, account_id, row in changes
+        ],
+        'since': encode_position(*position),
+        'has_more': has_more,
+    })
+
+
+@api_view(http_method_names=['GET'])
+def accounts_export(request):
+    """
+        Function to stream all the accounts data, as NDJSON (default) or CSV using the `output` parameter
+    """
+    export_format = request.query_params.get('output', 'ndjson')
+    if export_format not in EXPORT_FORMATS:
+        return Response(
+            {
+                'errors': {
+                    'output': 'Valid values are: {0}'.format(', '.join(sorted(EXPORT_FORMATS))),
+                }
+            },
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    # The rows are read and sent while the response is being consumed, never holding the full table in memory
+    _, content_type = EXPORT_FORMATS[export_format]
+    response = StreamingHttpResponse(export_accounts(export_format), content_type=content_type)
+    response['Content-Disposition'] = 'attachment; filename="accounts.{0}"'.format(export_format)
+    return response
 
 
 @api_view(http_method_names=['POST'])
@@ -143,16 +389,17 @@ def accounts_add(request):
     except AttributeError:
         nfe = 'non_field_errors'
 
-    # Parsing data from the request and changing the creator field for the user who did the request
+    # Parsing data from the request, the creator will be the user who did the request
     data = JSONParser().parse(request)
-    data['creator'] = request.user.pk
 
     # Check if all the data is valid to be used
-    serializer = AccountSerializer(data=data)
+    serializer = AccountSerializer(data=data, context={'request': request})
     if serializer.is_valid():
-        # If valid, create it and notify
+        # If valid, create it and notify, the unique index on iban is who rejects the duplicated ones
         try:
-            Account.objects.get(iban=serializer.validated_data['iban'])
+            with transaction.atomic():
+                serializer.create(serializer.validated_data)
+        except IntegrityError:
             response = {
                 'errors': {
                     nfe: 'iban already exists',
@@ -160,29 +407,77 @@ def accounts_add(request):
             }
             return Response(response, status=status.HTTP_400_BAD_REQUEST)
 
-        except Account.DoesNotExist:
-            serializer.create(serializer.validated_data)
-            response = {
-                'status': 'ok',
-                'message': 'created'
-            }
-            return Response(response, status=status.HTTP_201_CREATED)
+        accounts_changed.send(sender=Account)
+        response = {
+            'status': 'ok',
+            'message': 'created'
+        }
+        return Response(response, status=status.HTTP_201_CREATED)
     else:
         # If not valid, raise an error for data_validation
         response = {
-            {'errors': {'data_validation_error': 'Error validating data'}}
+            'errors': {'data_validation_error': 'Error validating data'}
         }
         return Response(response, status=status.HTTP_400_BAD_REQUEST)
 
 
+@api_view(http_method_names=['POST'])
+def accounts_add_bulk(request):
+    """
+        Function to manage the addition of several accounts in one request, returning the result of each of them
+    """
+    # If not declared in settings, configuring a default value
+    # http://www.django-rest-framework.org/api-guide/exceptions/#exception-handling-in-rest-framework-views
+    try:
+        nfe = settings.NON_FIELD_ERRORS_KEY
+    except AttributeError:
+        nfe = 'non_field_errors'
+
+    # Parsing data from the request, it must be a list of accounts
+    data = JSONParser().parse(request)
+    max_accounts = getattr(settings, 'ACCOUNTS_BULK_MAX_ACCOUNTS', 1000)
+    if not isinstance(data, list) or len(data) > max_accounts:
+        return Response(
+            {
+                'errors': {
+                    'data_validation_error': 'Expected a list of at most {0} accounts'.format(max_accounts),
+                }
+            },
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    try:
+        results = bulk_create_accounts(data, request.user)
+    except IntegrityError:
+        # Another request created one of the IBANs between the check and the insertion, nothing has been created
+        return Response(
+            {
+                'errors': {
+                    nfe: 'iban already exists',
+                }
+            },
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    created = sum(1 for result in results if result['status'] == CREATED)
+    if created:
+        accounts_changed.send(sender=Account)
+    return Response(
+        {
+            'status': 'ok',
+            'message': 'created',
+            'created': created,
+            'results': results,
+        },
+        status=status.HTTP_201_CREATED if created == len(results) else status.HTTP_207_MULTI_STATUS,
+    )
+
+
 @api_view(http_method_names=['PUT'])
 def accounts_modify(request):
     """
         Function to manage the accounts modification
     """
-    # Creating the default value
-    account = None
-
     # If not declared in settings, configuring a default value
     # http://www.django-rest-framework.org/api-guide/exceptions/#exception-handling-in-rest-framework-views
     try:
@@ -190,40 +485,43 @@ def accounts_modify(request):
     except AttributeError:
         nfe = 'non_field_errors'
 
-    # Parsing data from the request and changing the creator field for the user who did the request
+    # Parsing data from the request, only the fields sent will be modified
     data = JSONParser().parse(request)
-    data['creator'] = request.user.pk
 
     # Check if all the data is valid to be used
-    serializer = AccountSerializer(data=data)
-    if serializer.is_valid():
-        # If valid, try to get the model instance to check if already exists
-        try:
-            account = Account.objects.get(id=serializer.validated_data['id'])
-            # Check if the creator is who did the request
-            if request.user.pk == account.creator.pk:
-                # If yes, allow to modify it
-                serializer.update(account, serializer.validated_data)
-            else:
-                return Response(
-                    {
-                        'errors': {
-                            nfe: 'No permissions',
-                        }
-                    },
-                    status=status.HTTP_400_BAD_REQUEST,
-                )
-        except Account.DoesNotExist:
-            return Response(
-                {
-                    'errors': {
-                        nfe: 'Not exists',
-                    }
-                },
-                status=status.HTTP_400_BAD_REQUEST,
-            )
+    serializer = AccountSerializer(data=data, partial=True, context={'request': request})
+    if not serializer.is_valid() or 'id' not in serializer.validated_data:
+        return Response(
+            {
+                'errors': {
+                    'data_validation_error': 'Error validating data',
+                }
+            },
+            status=status.HTTP_400_BAD_REQUEST,
+        )
 
-    return Response({'status': 'ok', 'message': 'updated'})
+    # If valid, modify it only if the creator is who did the request (and nobody changed it since it was read)
+    version = serializer.validated_data.get('version')
+    try:
+        with transaction.atomic():
+            result = update_account(serializer.validated_data['id'], request.user, serializer.validated_data, version)
+    except IntegrityError:
+        return Response(
+            {
+                'errors': {
+                    nfe: 'iban already exists',
+                }
+            },
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    if result != UPDATED:
+        return write_error_response(result, nfe)
+    accounts_changed.send(sender=Account)
+
+    response = {'status': 'ok', 'message': 'updated'}
+    if version is not None:
+        response['version'] = version + 1
+    return Response(response)
 
 
 @api_view(http_method_names=['DELETE'])
@@ -231,9 +529,6 @@ def accounts_delete(request):
     """
         Function to manage the deletion of the accounts
     """
-    # Creating the default value
-    account = None
-
     # If not declared in settings, configuring a default value
     # http://www.django-rest-framework.org/api-guide/exceptions/#exception-handling-in-rest-framework-views
     try:
@@ -241,43 +536,12 @@ def accounts_delete(request):
     except AttributeError:
         nfe = 'non_field_errors'
 
-    # Parsing data from the request and changing the creator field for the user who did the request
+    # Parsing data from the request, only the id (and optionally the version) is needed
     data = JSONParser().parse(request)
-    data['creator'] = request.user.pk
 
     # Check if all the data is valid to be used
-    serializer = AccountSerializer(data=data)
-    if serializer.is_valid():
-        # If valid, try to get the model instance to check if already exists
-        try:
-            account = Account.objects.get(id=serializer.validated_data['id'])
-
-            # Check if the creator is who did the request
-            if request.user.pk == account.creator.pk:
-                account.delete()
-                return Response({
-                    'status': 'ok',
-                    'message': 'deleted'
-                })
-            else:
-                return Response(
-                    {
-                        'errors': {
-                            nfe: 'No permissions',
-                        }
-                    },
-                    status=status.HTTP_400_BAD_REQUEST,
-                )
-        except Account.DoesNotExist:
-            return Response(
-                {
-                    'errors': {
-                        nfe: 'Not exists',
-                    }
-                },
-                status=status.HTTP_400_BAD_REQUEST,
-            )
-    else:
+    serializer = AccountSerializer(data=data, partial=True, context={'request': request})
+    if not serializer.is_valid() or 'id' not in serializer.validated_data:
         return Response(
             {
                 'errors': {
@@ -286,3 +550,101 @@ def accounts_delete(request):
             },
             status=status.HTTP_400_BAD_REQUEST,
         )
+
+    # If valid, delete it only if the creator is who did the request (and nobody changed it since it was read)
+    result = delete_account(serializer.validated_data['id'], request.user, serializer.validated_data.get('version'))
+    if result != DELETED:
+        return write_error_response(result, nfe)
+    accounts_changed.send(sender=Account)
+
+    return Response({
+        'status': 'ok',
+        'message': 'deleted'
+    })
+
+
+@api_view(http_method_names=['POST'])
+def accounts_batch(request):
+    """
+        Function to manage several additions, modifications and deletions in one request and one transaction,
+        returning the result of each of them
+    """
+    # If not declared in settings, configuring a default value
+    # http://www.django-rest-framework.org/api-guide/exceptions/#exception-handling-in-rest-framework-views
+    try:
+        nfe = settings.NON_FIELD_ERRORS_KEY
+    except AttributeError:
+        nfe = 'non_field_errors'
+
+    # Parsing data from the request, it must have the list of operations and optionally how to handle the failures
+    data = JSONParser().parse(request)
+    operations = data.get('operations') if isinstance(data, dict) else None
+    mode = data.get('mode', 'atomic') if isinstance(data, dict) else None
+    max_operations = getattr(settings, 'ACCOUNTS_BATCH_MAX_OPERATIONS', 1000)
+    if not isinstance(operations, list) or len(operations) > max_operations or mode not in ('atomic', 'best_effort'):
+        return Response(
+            {
+                'errors': {
+                    'data_validation_error': 'Expected a list of at most {0} operations'.format(max_operations),
+                }
+            },
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    # Same rules as the single operations, only the creator can modify/delete an account
+    results, saved = run_batch(operations, request.user, atomic=mode == 'atomic')
+    if saved:
+        accounts_changed.send(sender=Account)
+
+    done = sum(1 for result in results if result['status'] in (CREATED, UPDATED, DELETED))
+    if mode == 'atomic' and done < len(results):
+        return Response(
+            {
+                'errors': {
+                    nfe: 'Nothing has been done, some operations failed',
+                },
+                'results': results,
+            },
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    return Response(
+        {
+            'status': 'ok',
+            'message': 'done',
+            'done': done,
+            'results': results,
+        },
+        status=status.HTTP_200_OK if done == len(results) else status.HTTP_207_MULTI_STATUS,
+    )
+
+
+@api_view(http_method_names=['GET'])
+@permission_classes([IsAdminUser])
+def metrics(request):
+    """
+        Function to show the requests metrics recorded by this process (MetricsMiddleware) to the staff users, in the
+        Prometheus text format
+    """
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+@api_view(http_method_names=['GET'])
+@permission_classes([IsAdminUser])
+def profiles(request):
+    """
+        Function to list the most recent request profiles (ProfilingMiddleware) to the staff users
+    """
+    return Response({'profiles': list_profiles()})
+
+
+@api_view(http_method_names=['GET'])
+@permission_classes([IsAdminUser])
+def profile_detail(request, profile_id):
+    """
+        Function to show the summary of one request profile to the staff users: the functions sorted by cumulative
+        time and the queries sorted by duration
+    """
+    summary = read_profile(profile_id)
+    if summary is None:
+        raise Http404
+    return HttpResponse(summary, content_type='text/plain; charset=utf-8')
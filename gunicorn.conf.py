@@ -0,0 +1,43 @@
+"""
+Configuration of the production server, read by gunicorn when started from this folder:
+
+    gunicorn usersmanagement.wsgi
+
+Every value can be changed with the environment variables below, or the gunicorn command line options
+"""
+import multiprocessing
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+
+# Processes serving the requests, and threads per process (more than one uses the threaded workers)
+workers = int(os.environ.get('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get('GUNICORN_THREADS', 1))
+
+# Loading the application once before forking, the workers share its memory (copy-on-write) and start right away
+preload_app = True
+
+# Replacing each worker after this many requests (plus a random jitter, so they do not restart all at once), once it
+# finishes the ones in progress, bounding the memory they can leak
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 10000))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 1000))
+
+# Seconds a request can take before its worker is killed, and the workers have to finish the current requests when
+# restarted or stopped
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = 30
+keepalive = 5
+
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG')
+
+
+def when_ready(server):
+    # In the master, once the application is loaded: shared by all the workers forked afterwards
+    from usersmanagement.warmup import warm_up
+    warm_up()
+
+
+def post_fork(server, worker):
+    # In every new worker, before it accepts any request
+    from usersmanagement.warmup import warm_connections
+    warm_connections()
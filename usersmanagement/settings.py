@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
 import os
+import tempfile
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -43,16 +44,22 @@ INSTALLED_APPS = [
     'rest_framework.authtoken',  # Used by our authtokens system
     'social_django',  # Used for the social authentications
     'corsheaders',  # Added to allow requests from a different web application
-    'account',
+    'account.apps.AccountConfig',
 ]
 
 MIDDLEWARE = [
+    # First one, so the metrics (requests latency, queries and response size per view) include all the others
+    'account.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',  # Added by the needed of corsheaders configuration
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    # Not loaded at all unless PROFILING['ENABLED']
+    'account.profiling.ProfilingMiddleware',
+    # Sending the reads of the GET views to the replicas, after the authentication of the session users
+    'account.routers.ReplicaRoutingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -84,12 +91,28 @@ WSGI_APPLICATION = 'usersmanagement.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        # Django's backend, checking the reused connections and with an optional pool (account/db/pool.py)
+        'ENGINE': 'account.db.postgresql',
         'NAME': os.environ.get('POSTGRES_DB_NAME'),
         'HOST': os.environ.get('POSTGRES_DB_HOST'),
         'PORT': os.environ.get('POSTGRES_DB_PORT'),
         'USER': os.environ.get('POSTGRES_DB_USERNAME'),
         'PASSWORD': os.environ.get('POSTGRES_DB_PASSWORD'),
+        # Seconds the connection of every thread is kept open for its next requests (0 to close it after every
+        # request), checked before its first query of every request
+        'CONN_MAX_AGE': int(os.environ.get('POSTGRES_CONN_MAX_AGE', 60)) if not os.environ.get('POSTGRES_POOL_SIZE')
+        else 0,
+        'CONN_HEALTH_CHECKS': True,
+        # With POSTGRES_POOL_SIZE, the connections are shared by the threads of every process instead: each request
+        # takes one from the pool (waiting up to TIMEOUT seconds when all of them are in use) and returns it at the
+        # end. The ones idle for more than CHECK_AFTER seconds are checked before reusing them, and closed after
+        # MAX_IDLE seconds
+        'POOL': {
+            'MAX_SIZE': int(os.environ['POSTGRES_POOL_SIZE']),
+            'TIMEOUT': 5,
+            'MAX_IDLE': 300,
+            'CHECK_AFTER': 30,
+        } if os.environ.get('POSTGRES_POOL_SIZE') else None,
     },
     # 'development': {
     #     'ENGINE': 'django.db.backends.sqlite3',
@@ -98,6 +121,29 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/2.2/topics/cache/
+# Local memory is per process, only for what every process can keep on its own. `shared` is seen by all the processes
+# (the gunicorn workers): files in CACHE_LOCATION, shared by the processes of the same host, or memcached in
+# MEMCACHED_LOCATION (comma separated host:port) to share it between several hosts
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('CACHE_LOCATION', os.path.join(tempfile.gettempdir(), 'usersmanagement-cache')),
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+}
+if os.environ.get('MEMCACHED_LOCATION'):
+    CACHES['shared'] = {
+        'BACKEND': 'django.core.cache.backends.memcached.MemcachedCache',
+        'LOCATION': os.environ['MEMCACHED_LOCATION'].split(','),
+    }
+
+
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
 
@@ -127,12 +173,36 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated'
     ],
-    # Our app will be based in authtokens system
+    # Our app will be based in authtokens system, caching the tokens already checked
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework.authentication.TokenAuthentication',
+        'account.authentication.CachedTokenAuthentication',
     ),
 }
 
+# Authenticated tokens kept in memory by each process: maximum number of them, seconds they are trusted before
+# checking them again in the database, and alias (from CACHES) of the cache shared between processes, through which
+# a logout in one process is seen by all of them (None to keep the tokens of a logout accepted by the others until TTL)
+TOKEN_AUTH_CACHE = {
+    'MAX_SIZE': 10000,
+    'TTL': 60,
+    'SHARED_CACHE': 'shared',
+}
+
+# Seconds a token is accepted without being used (None to never expire them), each use moving its expiry forward at
+# most once every REFRESH_AFTER seconds. Expired tokens are deleted with `manage.py purge_tokens`
+TOKEN_EXPIRY = {
+    'LIFETIME': 7 * 24 * 3600,
+    'REFRESH_AFTER': 3600,
+}
+
+# Same as TOKEN_AUTH_CACHE for the OAuth2 access tokens already exchanged in `token_authentication`, so the provider
+# is not called again for the same access token within TTL seconds
+OAUTH2_EXCHANGE_CACHE = {
+    'MAX_SIZE': 10000,
+    'TTL': 30,
+    'SHARED_CACHE': None,
+}
+
 # Google API KEY (Uncomment to use my Google KEY and Secret, only for testing)
 # SOCIAL_AUTH_GOOGLE_OAUTH2_KEY = '1004293666145-8umatqo78csrfqgq1frhcdhvqv9bq415.apps.googleusercontent.com'
 # SOCIAL_AUTH_GOOGLE_OAUTH2_SECRET = 'yMZ07sUmLTxIyiagBY6ibK3w'
@@ -168,6 +238,62 @@ SOCIAL_AUTH_PIPELINE = (
 
 NON_FIELD_ERRORS_KEY = 'non_field_error'
 
+# Default number of accounts returned per page by the paginated listings, and the hard cap for `page_size`
+ACCOUNTS_PAGE_SIZE = 100
+ACCOUNTS_MAX_PAGE_SIZE = 1000
+
+# Number of rows fetched per round trip (server-side cursor on PostgreSQL) when exporting all the accounts
+ACCOUNTS_EXPORT_CHUNK_SIZE = 2000
+
+# Number of rows validated and inserted at once (each chunk in its own transaction) by the import command
+ACCOUNTS_IMPORT_CHUNK_SIZE = 10000
+
+# Seconds the change feed waits before returning a change, so transactions committed late are not skipped
+ACCOUNTS_CHANGES_SETTLE_SECONDS = 5
+
+# Number of rows inserted per statement when creating accounts in bulk, and maximum number of accounts per request
+ACCOUNTS_BULK_BATCH_SIZE = 1000
+ACCOUNTS_BULK_MAX_ACCOUNTS = 1000
+
+# Maximum number of operations (additions, modifications and deletions) accepted in one batch request
+ACCOUNTS_BATCH_MAX_OPERATIONS = 1000
+
+# Requests profiled with cProfile by account.profiling.ProfilingMiddleware: the ones of the staff users sending the
+# HEADER, plus a SAMPLE_RATE (0 to 1) of all of them. The profiles (.prof) and their summaries (.txt, with the TOP
+# functions and queries) are written to DIRECTORY, which only keeps the KEEP most recent ones, and listed by the
+# staff-only /profiles/ endpoint
+PROFILING = {
+    'ENABLED': os.environ.get('PROFILING_ENABLED') == '1',
+    'HEADER': 'X-Profile',
+    'SAMPLE_RATE': float(os.environ.get('PROFILING_SAMPLE_RATE', 0)),
+    'DIRECTORY': os.path.join(BASE_DIR, 'profiles'),
+    'TOP': 40,
+    'KEEP': 200,
+}
+
+# Cache (alias from CACHES, shared by all the processes) keeping the accounts listing until the accounts change, and
+# seconds each version is kept
+ACCOUNTS_CACHE = 'shared'
+ACCOUNTS_CACHE_TIMEOUT = 3600
+
+# Read replicas, the same database as the primary (`default`) in the hosts of POSTGRES_REPLICA_HOSTS (comma separated)
+for index, host in enumerate(filter(None, os.environ.get('POSTGRES_REPLICA_HOSTS', '').split(','))):
+    DATABASES['replica-{0}'.format(index)] = dict(DATABASES['default'], HOST=host, TEST={'MIRROR': 'default'})
+
+DATABASE_ROUTERS = ['account.routers.ReplicaRouter']
+
+# Reads of the GET views of the APPS sent to the REPLICAS (alias: weight, taking turns as many times as their weight),
+# except the PRIMARY_VIEWS (the cached listing is always built from the primary, and the change feed can not skip the
+# changes not replicated yet) and the requests of the tokens which wrote something in the last STICKY_SECONDS (stored in
+# CACHE, which must be shared by all the processes, a local memory one is refused)
+DATABASE_REPLICAS = {
+    'REPLICAS': {alias: 1 for alias in DATABASES if alias != 'default'},
+    'STICKY_SECONDS': 5,
+    'PRIMARY_VIEWS': ['accounts:accounts', 'accounts:accounts_changes'],
+    'APPS': ['account'],
+    'CACHE': 'shared',
+}
+
 # Internationalization
 # https://docs.djangoproject.com/en/2.2/topics/i18n/
 
@@ -25,6 +25,9 @@ urlpatterns = [
     path('admin/', admin.site.urls),
     path('logout/', views.logout, name='logout'),
     # allowing backend as variable to have the possibility to add more authenticators than Google
-    url(r'^auth/(?P<backend>[^/]+)/$', views.token_authentication),
+    url(r'^auth/(?P<backend>[^/]+)/$', views.token_authentication, name='token_authentication'),
     path('accounts/', include(account.urls, namespace='accounts')),
+    path('metrics', views.metrics, name='metrics'),
+    path('profiles/', views.profiles, name='profiles'),
+    path('profiles/<str:profile_id>/', views.profile_detail, name='profile_detail'),
 ]
@@ -0,0 +1,47 @@
+"""
+Work done once before serving the requests, instead of during the first ones (see gunicorn.conf.py)
+"""
+import inspect
+
+from django.conf import settings
+from django.db import connections
+from django.urls import get_resolver
+
+from rest_framework.serializers import BaseSerializer
+
+from social_core.backends.utils import load_backends
+
+from account.db.pool import close_pools
+
+
+def warm_up():
+    """
+    Load everything the requests would load lazily: URL patterns (compiled and indexed for reversing), views,
+    serializers and the models metadata they use, and the authentication backends.
+
+    Meant to run in the master process before forking, so the workers share all of it. It leaves no connection open,
+    the workers must not share the database sockets
+    """
+    resolver = get_resolver()
+    # Populates the lookups of all the included URL confs as well, compiling every pattern
+    resolver.reverse_dict
+    resolver.namespace_dict
+    resolver.app_dict
+
+    from account import serializers
+    for _, serializer_class in inspect.getmembers(serializers, inspect.isclass):
+        if issubclass(serializer_class, BaseSerializer) and serializer_class.__module__ == serializers.__name__:
+            serializer_class().fields
+
+    load_backends(settings.AUTHENTICATION_BACKENDS, force_load=True)
+    connections.close_all()
+    # Closed returns the pooled connections to their pool
+    close_pools()
+
+
+def warm_connections():
+    """
+    Open the connections of this process to every database (kept for the first requests when CONN_MAX_AGE allows it)
+    """
+    for alias in connections:
+        connections[alias].ensure_connection()